@@ -6,6 +6,13 @@ import datetime as dt
 from pathlib import Path
 import argparse
 import logging
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from ingest import REQUIRED_COLUMNS, clean_transactions, infer_csv_date_format, infer_date_format, load_raw, load_transactions, to_columnar
+from rfm_utils import aggregate_rfm
+from instrumentation import enable_memory_tracing, instrumented, write_metrics
 
 # --- Setup basic logging ---
 logging.basicConfig(
@@ -16,113 +23,306 @@ logging.basicConfig(
     ]
 )
 
-def load_raw(path: str) -> pd.DataFrame:
+def format_customer_ids(ids: pd.Series) -> pd.Series:
     """
-    Loads the raw transaction data from a CSV file.
+    Converts customer IDs to the strings written to rfm.csv.
+
+    The raw CustomerID column holds floats (it has missing values), so rfm.csv
+    has always used their string form, e.g. "12346.0". Numeric IDs are cast
+    back to float first, so the int32 IDs from to_columnar and the IDs of a
+    reloaded state keep that form.
 
     Args:
-        path (str): The file path to the raw CSV data.
+        ids (pd.Series): Customer IDs, numeric or not.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the loaded data.
-    
-    Raises:
-        FileNotFoundError: If the file at the specified path does not exist.
-        ValueError: If essential columns are missing from the CSV.
+        pd.Series: The IDs as strings.
     """
-    logging.info(f"Attempting to load raw data from: {path}")
-    try:
-        # UCI/Kaggle export often needs this specific encoding
-        df = pd.read_csv(path, encoding="ISO-8859-1")
-        logging.info("Raw data loaded successfully.")
-    except FileNotFoundError:
-        logging.error(f"Error: The file was not found at {path}")
-        raise
-
-    # Defensively check for required columns
-    required_cols = ["InvoiceNo", "Quantity", "InvoiceDate", "UnitPrice", "CustomerID"]
-    if not all(col in df.columns for col in required_cols):
-        logging.error("One or more required columns are missing from the CSV.")
-        raise ValueError(f"CSV must contain the following columns: {required_cols}")
-        
-    return df
+    if pd.api.types.is_numeric_dtype(ids):
+        return ids.astype("float64").astype(str)
+    return ids.astype(str)
 
-def clean_transactions(df: pd.DataFrame) -> pd.DataFrame:
+@instrumented
+def compute_rfm(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Cleans the raw transaction DataFrame by handling missing values,
-    removing cancelled orders, and filtering out invalid data points.
+    Computes Recency, Frequency, and Monetary (RFM) metrics for each customer.
 
     Args:
-        df (pd.DataFrame): The raw transaction DataFrame.
+        df (pd.DataFrame): The cleaned transaction DataFrame.
 
     Returns:
-        pd.DataFrame: A cleaned DataFrame ready for RFM calculation.
+        pd.DataFrame: A DataFrame with CustomerID and their RFM values.
     """
-    logging.info("Starting transaction data cleaning...")
-    
-    # Drop rows where CustomerID is null, as they are not useful for segmentation
-    df = df.dropna(subset=["CustomerID"]).copy()
-    
-    # Ensure InvoiceNo is a string to handle potential mixed types
-    df["InvoiceNo"] = df["InvoiceNo"].astype(str)
-    
-    # Remove cancellation invoices (often marked with a 'C')
-    df = df[~df["InvoiceNo"].str.startswith("C")]
+    logging.info("Computing RFM features...")
     
-    # Remove rows with non-positive quantity or unit price, as they are not valid sales
-    df = df[(df["Quantity"] > 0) & (df["UnitPrice"] > 0)]
+    # Set a reference date for recency calculation (one day after the last transaction)
+    reference_date = df["InvoiceDate"].max() + dt.timedelta(days=1)
     
-    # Convert InvoiceDate to datetime objects, coercing errors
-    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"], dayfirst=True, errors="coerce")
-    df = df.dropna(subset=["InvoiceDate"]) # Drop rows where date conversion failed
+    # Single grouped pass: max date, unique invoices and total spend per customer
+    rfm = aggregate_rfm(df, reference_date=reference_date)
     
-    # Calculate total price for each transaction
-    df["TotalPrice"] = df["Quantity"] * df["UnitPrice"]
+    # Ensure CustomerID is a string for consistency
+    rfm["CustomerID"] = format_customer_ids(rfm["CustomerID"])
+    rfm = rfm.sort_values("CustomerID").reset_index(drop=True)
     
-    logging.info(f"Cleaning complete. Shape of cleaned data: {df.shape}")
-    return df
+    logging.info("RFM computation complete.")
+    return rfm
 
-def compute_rfm(df: pd.DataFrame) -> pd.DataFrame:
+def compute_rfm_state(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Computes Recency, Frequency, and Monetary (RFM) metrics for each customer.
+    Computes the per-customer state that RFM values are derived from.
 
     Args:
         df (pd.DataFrame): The cleaned transaction DataFrame.
 
     Returns:
-        pd.DataFrame: A DataFrame with CustomerID and their RFM values.
+        pd.DataFrame: Indexed by CustomerID, with LastPurchase (datetime),
+        Frequency (distinct invoices) and Monetary (summed TotalPrice).
     """
-    logging.info("Computing RFM features...")
-    
-    # Set a reference date for recency calculation (one day after the last transaction)
-    reference_date = df["InvoiceDate"].max() + dt.timedelta(days=1)
-    
-    rfm = df.groupby("CustomerID").agg(
-        Recency=("InvoiceDate", lambda x: (reference_date - x.max()).days), 
-        Frequency=("InvoiceNo", "nunique"), # Count unique invoices for frequency
+    return df.groupby("CustomerID").agg(
+        LastPurchase=("InvoiceDate", "max"),
+        Frequency=("InvoiceNo", "nunique"),
         Monetary=("TotalPrice", "sum"),
-    ).reset_index()
-    
+    )
+
+def rfm_from_state(state: pd.DataFrame, reference_date) -> pd.DataFrame:
+    """
+    Derives the RFM table from a per-customer state.
+
+    Args:
+        state (pd.DataFrame): Per-customer state (see compute_rfm_state).
+        reference_date: The date Recency is measured against.
+
+    Returns:
+        pd.DataFrame: A DataFrame with CustomerID and their RFM values,
+        in the same format as compute_rfm.
+    """
+    rfm = pd.DataFrame({
+        "CustomerID": state.index,
+        "Recency": (reference_date - state["LastPurchase"]).dt.days.values,
+        "Frequency": state["Frequency"].values,
+        "Monetary": state["Monetary"].values,
+    })
+
     # Ensure CustomerID is a string for consistency
-    rfm["CustomerID"] = rfm["CustomerID"].astype(str)
+    rfm["CustomerID"] = format_customer_ids(rfm["CustomerID"])
     rfm = rfm.sort_values("CustomerID").reset_index(drop=True)
-    
+    return rfm
+
+def compute_rfm_state_streaming(path: str, chunksize: int) -> pd.DataFrame:
+    """
+    Computes the per-customer state by reading the raw CSV in fixed-size chunks.
+
+    Each chunk is cleaned and folded into per-customer partial aggregates
+    (last purchase date, set of invoices seen, summed TotalPrice), so peak
+    memory depends on the number of customers rather than transaction rows.
+    Every chunk parses InvoiceDate with the one format picked by
+    ingest.infer_csv_date_format, so the result does not depend on chunksize.
+
+    Args:
+        path (str): The file path to the raw CSV data.
+        chunksize (int): Number of transaction rows to read per chunk.
+
+    Returns:
+        pd.DataFrame: The same state compute_rfm_state produces for the whole file.
+    """
+    logging.info(f"Streaming raw data from {path} in chunks of {chunksize} rows...")
+    partial = None       # Per-customer LastPurchase / Monetary
+    invoice_sets = {}    # CustomerID -> set of InvoiceNo seen so far
+    date_format = None   # Inferred once from the date column, then reused
+    n_rows = 0
+
+    try:
+        reader = pd.read_csv(path, encoding="ISO-8859-1", chunksize=chunksize)
+        for i, chunk in enumerate(reader):
+            if i == 0 and not all(col in chunk.columns for col in REQUIRED_COLUMNS):
+                logging.error("One or more required columns are missing from the CSV.")
+                raise ValueError(f"CSV must contain the following columns: {REQUIRED_COLUMNS}")
+            if i == 0:
+                date_format = infer_csv_date_format(path, chunksize=chunksize, encoding="ISO-8859-1")
+                logging.info(f"Parsing InvoiceDate with format {date_format!r}")
+            n_rows += len(chunk)
+
+            df = to_columnar(clean_transactions(chunk, date_format))
+            if df.empty:
+                continue
+
+            grouped = df.groupby("CustomerID").agg(
+                LastPurchase=("InvoiceDate", "max"),
+                Monetary=("TotalPrice", "sum"),
+            )
+            if partial is None:
+                partial = grouped
+            else:
+                partial = pd.concat([partial, grouped]).groupby(level=0).agg(
+                    {"LastPurchase": "max", "Monetary": "sum"}
+                )
+
+            for customer_id, invoices in df.groupby("CustomerID")["InvoiceNo"].unique().items():
+                invoice_sets.setdefault(customer_id, set()).update(invoices)
+    except FileNotFoundError:
+        logging.error(f"Error: The file was not found at {path}")
+        raise
+
+    if partial is None:
+        raise ValueError("No valid transactions found in the input file.")
+    logging.info(f"Streamed {n_rows} raw rows for {len(partial)} customers.")
+
+    partial["Frequency"] = [len(invoice_sets[c]) for c in partial.index]
+    return partial[["LastPurchase", "Frequency", "Monetary"]]
+
+def compute_rfm_streaming(path: str, chunksize: int) -> pd.DataFrame:
+    """
+    Computes RFM metrics by reading the raw CSV in fixed-size chunks.
+
+    Args:
+        path (str): The file path to the raw CSV data.
+        chunksize (int): Number of transaction rows to read per chunk.
+
+    Returns:
+        pd.DataFrame: A DataFrame with CustomerID and their RFM values,
+        identical to what compute_rfm produces for the whole file.
+    """
+    state = compute_rfm_state_streaming(path, chunksize)
+    reference_date = state["LastPurchase"].max() + dt.timedelta(days=1)
+    rfm = rfm_from_state(state, reference_date)
     logging.info("RFM computation complete.")
     return rfm
 
-def build_rfm_pipeline(raw_csv_path: str, out_csv_path: str):
+def _clean_and_aggregate(partition: pd.DataFrame, date_format: str = None) -> pd.DataFrame:
+    """Worker task: cleans one customer partition and returns its per-customer state."""
+    df = to_columnar(clean_transactions(partition, date_format))
+    return compute_rfm_state(df)
+
+def compute_rfm_state_parallel(path: str, workers: int) -> pd.DataFrame:
+    """
+    Computes the per-customer state using a pool of worker processes.
+
+    Transactions are hash-partitioned by CustomerID, so every customer's rows
+    land in exactly one partition and the partial states can simply be
+    concatenated without a cross-worker merge. The InvoiceDate format is
+    inferred once from the whole file and used by every partition.
+
+    Args:
+        path (str): The file path to the raw CSV data.
+        workers (int): Number of worker processes (and partitions).
+
+    Returns:
+        pd.DataFrame: The same state compute_rfm_state produces for the whole file.
+    """
+    df_raw = load_raw(path)
+    df_raw = df_raw.dropna(subset=["CustomerID"])
+    date_format = infer_date_format(df_raw["InvoiceDate"])
+    logging.info(f"Parsing InvoiceDate with format {date_format!r}")
+
+    logging.info(f"Partitioning {len(df_raw)} rows by CustomerID across {workers} workers...")
+    partition_ids = pd.util.hash_pandas_object(df_raw["CustomerID"], index=False).values % workers
+    partitions = [part for _, part in df_raw.groupby(partition_ids)]
+    del df_raw
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        states = list(executor.map(partial(_clean_and_aggregate, date_format=date_format), partitions))
+
+    states = [state for state in states if not state.empty]
+    if not states:
+        raise ValueError("No valid transactions found in the input file.")
+    return pd.concat(states)
+
+def update_rfm_state(state: pd.DataFrame, reference_date, delta: pd.DataFrame):
+    """
+    Folds a batch of new (cleaned) transactions into an existing state.
+
+    Only the delta is aggregated; existing customers are merged by taking the
+    latest purchase date and adding invoice counts and spend. Invoices in the
+    delta are assumed not to have been seen in earlier batches.
+
+    Args:
+        state (pd.DataFrame): Existing per-customer state.
+        reference_date: The reference date stored with the existing state.
+        delta (pd.DataFrame): The cleaned transactions of the new batch.
+
+    Returns:
+        tuple: The updated state and the new reference date.
+    """
+    if delta.empty:
+        return state, reference_date
+
+    delta_state = compute_rfm_state(delta)
+    state = pd.concat([state, delta_state]).groupby(level=0).agg(
+        {"LastPurchase": "max", "Frequency": "sum", "Monetary": "sum"}
+    )
+    reference_date = max(reference_date, delta["InvoiceDate"].max() + dt.timedelta(days=1))
+    return state, reference_date
+
+def save_rfm_state(state: pd.DataFrame, reference_date, path: str):
+    """
+    Persists the per-customer state to a CSV, with the reference date in a JSON sidecar.
+
+    Args:
+        state (pd.DataFrame): Per-customer state.
+        reference_date: The reference date of the state.
+        path (str): Path to the state CSV file (the sidecar uses a .json suffix).
+    """
+    state_path = Path(path)
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state.to_csv(state_path, index_label="CustomerID", date_format="%Y-%m-%d %H:%M:%S")
+    state_path.with_suffix(".json").write_text(
+        json.dumps({"reference_date": pd.Timestamp(reference_date).isoformat()}, indent=2)
+    )
+    logging.info(f"RFM state for {len(state)} customers saved to {state_path}")
+
+def load_rfm_state(path: str):
+    """
+    Loads a per-customer state written by save_rfm_state.
+
+    Args:
+        path (str): Path to the state CSV file.
+
+    Returns:
+        tuple: The state DataFrame and its reference date.
+    """
+    state_path = Path(path)
+    logging.info(f"Loading RFM state from {state_path}...")
+    state = pd.read_csv(state_path, index_col="CustomerID", parse_dates=["LastPurchase"])
+    meta = json.loads(state_path.with_suffix(".json").read_text())
+    return state, pd.Timestamp(meta["reference_date"])
+
+def build_rfm_pipeline(raw_csv_path: str, out_csv_path: str, chunksize: int = None,
+                       cache_dir: str = "artifacts/cache", state_path: str = None,
+                       workers: int = 1):
     """
     Orchestrates the full pipeline: load, clean, compute RFM, and save.
 
     Args:
         raw_csv_path (str): Path to the input raw data file.
         out_csv_path (str): Path to save the output RFM CSV file.
+        chunksize (int, optional): If set, stream the input in chunks of this
+            many rows instead of loading it into memory at once.
+        cache_dir (str, optional): Directory of the cleaned-transaction
+            Parquet cache shared with 005_build_cohort.py. None disables it.
+        state_path (str, optional): If set, also save the per-customer state
+            so later deltas can be applied with incremental_rfm_pipeline.
+        workers (int, optional): If greater than 1, clean and aggregate
+            CustomerID partitions in this many worker processes.
     """
     logging.info("--- Starting RFM Build Pipeline ---")
     
-    df_raw = load_raw(raw_csv_path)
-    df_clean = clean_transactions(df_raw)
-    rfm_features = compute_rfm(df_clean)
+    if chunksize or workers > 1:
+        if chunksize:
+            state = compute_rfm_state_streaming(raw_csv_path, chunksize)
+        else:
+            state = compute_rfm_state_parallel(raw_csv_path, workers)
+        reference_date = state["LastPurchase"].max() + dt.timedelta(days=1)
+        rfm_features = rfm_from_state(state, reference_date)
+    else:
+        df_clean = load_transactions(raw_csv_path, cache_dir=cache_dir)
+        rfm_features = compute_rfm(df_clean)
+        if state_path:
+            state = compute_rfm_state(df_clean)
+            reference_date = df_clean["InvoiceDate"].max() + dt.timedelta(days=1)
+
+    if state_path:
+        save_rfm_state(state, reference_date, state_path)
 
     # Ensure the output directory exists
     out_path = Path(out_csv_path)
@@ -136,6 +336,44 @@ def build_rfm_pipeline(raw_csv_path: str, out_csv_path: str):
     logging.info(f"Output saved to: {out_path}")
     logging.info("--- RFM Build Pipeline Finished ---")
 
+def incremental_rfm_pipeline(delta_csv_path: str, state_path: str, out_csv_path: str):
+    """
+    Applies a delta file of new invoices to the saved state and rewrites rfm.csv,
+    without rescanning the transaction history.
+
+    If no state exists yet, the delta is treated as the full history.
+
+    Args:
+        delta_csv_path (str): Path to the raw CSV with the new transactions.
+        state_path (str): Path to the persisted per-customer state.
+        out_csv_path (str): Path to save the output RFM CSV file.
+    """
+    logging.info("--- Starting Incremental RFM Update ---")
+
+    delta = to_columnar(clean_transactions(load_raw(delta_csv_path)))
+
+    if Path(state_path).exists():
+        state, reference_date = load_rfm_state(state_path)
+        n_before = len(state)
+        state, reference_date = update_rfm_state(state, reference_date, delta)
+        logging.info(f"Applied {len(delta)} transactions; {len(state) - n_before} new customers.")
+    else:
+        if delta.empty:
+            raise ValueError("No existing RFM state and no valid transactions in the delta file.")
+        logging.info("No existing RFM state found; initialising it from the delta file.")
+        state = compute_rfm_state(delta)
+        reference_date = delta["InvoiceDate"].max() + dt.timedelta(days=1)
+
+    save_rfm_state(state, reference_date, state_path)
+
+    rfm_features = rfm_from_state(state, reference_date)
+    out_path = Path(out_csv_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    rfm_features.to_csv(out_path, index=False)
+
+    logging.info(f"Total customers: {len(rfm_features)}. Output saved to: {out_path}")
+    logging.info("--- Incremental RFM Update Finished ---")
+
 
 if __name__ == "__main__":
     # --- Command-Line Interface ---
@@ -156,6 +394,72 @@ if __name__ == "__main__":
         default="artifacts/rfm.csv", 
         help="Path to save the output RFM CSV file."
     )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Stream the input in chunks of this many rows (for files too large for memory)."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default="artifacts/cache",
+        help="Directory for the cleaned-transaction Parquet cache."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always re-parse the raw CSV instead of using the Parquet cache."
+    )
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=None,
+        help="Path to the per-customer RFM state CSV (written on full builds, required with --incremental)."
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Treat --input as a delta file of new invoices and fold it into --state."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes for the (in-memory) RFM computation."
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Optional path of a JSON file to write per-stage timing and memory metrics to."
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Also record each stage's own allocation peak via tracemalloc (slower)."
+    )
     args = parser.parse_args()
 
-    build_rfm_pipeline(raw_csv_path=args.input, out_csv_path=args.output)
+    if args.trace_memory:
+        enable_memory_tracing()
+
+    if args.chunksize and args.workers > 1:
+        parser.error("--chunksize and --workers cannot be combined")
+
+    if args.incremental:
+        if not args.state:
+            parser.error("--incremental requires --state")
+        incremental_rfm_pipeline(delta_csv_path=args.input, state_path=args.state, out_csv_path=args.output)
+    else:
+        build_rfm_pipeline(
+            raw_csv_path=args.input,
+            out_csv_path=args.output,
+            chunksize=args.chunksize,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            state_path=args.state,
+            workers=args.workers
+        )
+
+    if args.metrics:
+        write_metrics(args.metrics)
@@ -2,14 +2,23 @@
 # Automated, configurable model training pipeline
 
 import pandas as pd
+import numpy as np
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
 import joblib
 from pathlib import Path
 import matplotlib.pyplot as plt
 import argparse
 import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from instrumentation import enable_memory_tracing, instrumented, write_metrics
+from inference import export_model_bundle
+from manifest import compute_cache_key, is_up_to_date, record_run
 
 # --- Setup basic logging ---
 logging.basicConfig(
@@ -39,6 +48,7 @@ def load_rfm_features(path: str) -> pd.DataFrame:
         logging.error(f"Error: RFM file not found at {path}. Please run the feature building script first.")
         raise
 
+@instrumented
 def scale_features(rfm: pd.DataFrame) -> (pd.DataFrame, StandardScaler):
     """
     Scales the Recency, Frequency, and Monetary columns using StandardScaler.
@@ -56,47 +66,321 @@ def scale_features(rfm: pd.DataFrame) -> (pd.DataFrame, StandardScaler):
     logging.info("Features scaled successfully.")
     return rfm_scaled, scaler
 
-def find_and_visualize_optimal_k(X_scaled: pd.DataFrame, max_k: int, out_dir: str):
+def sampled_silhouette(X_scaled, labels, sample_size: int, repeats: int, random_state: int = 42) -> tuple:
+    """
+    Estimates the silhouette score on stratified random samples.
+
+    Each repeat draws sample_size points, taking from every cluster in
+    proportion to its size (at least one point per cluster), so the cost is
+    O(sample_size²) instead of O(n²).
+
+    Args:
+        X_scaled: The scaled feature data.
+        labels: Cluster label of every row.
+        sample_size (int): Points per sample.
+        repeats (int): Number of independent samples.
+        random_state (int): Seed for the sampling.
+
+    Returns:
+        tuple: Mean and variance of the silhouette score over the repeats.
+    """
+    X_scaled = np.asarray(X_scaled)
+    labels = np.asarray(labels)
+    n = len(labels)
+    if sample_size >= n:
+        return silhouette_score(X_scaled, labels), 0.0
+
+    rng = np.random.default_rng(random_state)
+    clusters, counts = np.unique(labels, return_counts=True)
+    per_cluster = np.maximum(1, np.round(counts * sample_size / n).astype(int))
+    members = {c: np.flatnonzero(labels == c) for c in clusters}
+
+    scores = []
+    for _ in range(repeats):
+        idx = np.concatenate([
+            rng.choice(members[c], size=min(size, len(members[c])), replace=False)
+            for c, size in zip(clusters, per_cluster)
+        ])
+        scores.append(silhouette_score(X_scaled[idx], labels[idx]))
+    return float(np.mean(scores)), float(np.var(scores))
+
+def simplified_silhouette(X_scaled, kmeans: KMeans) -> float:
+    """
+    Centroid-based simplified silhouette, computed in O(n·k).
+
+    For each point, a is the distance to its own centroid and b the distance
+    to the nearest other centroid; the score is the mean of (b - a) / max(a, b).
+
+    Args:
+        X_scaled: The scaled feature data.
+        kmeans (KMeans): A fitted KMeans model.
+
+    Returns:
+        float: The simplified silhouette score.
+    """
+    distances = kmeans.transform(X_scaled)
+    rows = np.arange(len(distances))
+    a = distances[rows, kmeans.labels_]
+    distances[rows, kmeans.labels_] = np.inf
+    b = distances.min(axis=1)
+    denom = np.maximum(a, b)
+    s = np.divide(b - a, denom, out=np.zeros_like(a), where=denom > 0)
+    return float(s.mean())
+
+def score_clustering(X_scaled, kmeans: KMeans, method: str = "exact",
+                     sample_size: int = 10000, repeats: int = 5) -> tuple:
+    """
+    Scores a fitted KMeans model with the chosen silhouette method.
+
+    Args:
+        X_scaled: The scaled feature data.
+        kmeans (KMeans): A fitted KMeans model.
+        method (str): "exact" (O(n²)), "sampled" or "simplified".
+        sample_size (int): Points per sample for the "sampled" method.
+        repeats (int): Number of samples for the "sampled" method.
+
+    Returns:
+        tuple: The score and its variance across samples (None unless sampled).
+    """
+    if method == "sampled":
+        return sampled_silhouette(X_scaled, kmeans.labels_, sample_size, repeats)
+    if method == "simplified":
+        return simplified_silhouette(X_scaled, kmeans), None
+    if method == "exact":
+        return silhouette_score(X_scaled, kmeans.labels_), None
+    raise ValueError(f"Unknown silhouette method: {method}")
+
+# Scaled data shared with the k-sweep worker processes (set once per worker)
+_SWEEP_DATA = None
+
+def _init_sweep_worker(X_scaled):
+    """Process-pool initializer: keeps the data in the worker and pins BLAS/OpenMP to one thread."""
+    global _SWEEP_DATA
+    _SWEEP_DATA = X_scaled
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=1)
+    except ImportError:
+        pass
+
+N_RESTARTS = 10
+
+def fit_with_restarts(X_scaled, k: int, n_init: int = N_RESTARTS, random_state: int = 42) -> tuple:
+    """
+    Fits k-means++ KMeans n_init times and keeps the lowest-SSE run.
+
+    Same as KMeans(n_init=n_init), except that the iterations of every
+    restart are counted (KMeans.n_iter_ only covers the kept run).
+
+    Returns:
+        tuple: The best KMeans model and the total iterations of all restarts.
+    """
+    seeds = np.random.RandomState(random_state).randint(np.iinfo(np.int32).max, size=n_init)
+    best, total_iter = None, 0
+    for seed in seeds:
+        kmeans = KMeans(n_clusters=k, n_init=1, random_state=seed)
+        kmeans.fit(X_scaled)
+        total_iter += kmeans.n_iter_
+        if best is None or kmeans.inertia_ < best.inertia_:
+            best = kmeans
+    return best, total_iter
+
+def _evaluate_k(k: int, X_scaled=None, scoring: dict = None) -> dict:
+    """Fits KMeans for one k from scratch and returns its sweep record."""
+    if X_scaled is None:
+        X_scaled = _SWEEP_DATA
+    start = time.perf_counter()
+    kmeans, total_iter = fit_with_restarts(X_scaled, k)
+    seconds = time.perf_counter() - start
+    score, variance = score_clustering(X_scaled, kmeans, **(scoring or {}))
+    return {"k": k, "sse": kmeans.inertia_, "silhouette": score, "silhouette_var": variance,
+            "n_iter": kmeans.n_iter_, "total_iter": total_iter, "fits": N_RESTARTS,
+            "seeded": "k-means++", "seconds": seconds}
+
+def split_worst_cluster(X_scaled, centers, labels):
+    """
+    Seeds k+1 centroids from k converged ones by splitting the cluster with the
+    highest SSE along its principal axis (one standard deviation either side).
+
+    Returns:
+        np.ndarray: The k+1 initial centroids, or None if the cluster cannot be split.
+    """
+    X_scaled = np.asarray(X_scaled)
+    sq_dist = ((X_scaled - centers[labels]) ** 2).sum(axis=1)
+    cluster_sse = np.bincount(labels, weights=sq_dist, minlength=len(centers))
+    worst = int(cluster_sse.argmax())
+
+    members = X_scaled[labels == worst] - centers[worst]
+    if len(members) < 2:
+        return None
+    _, singular_values, axes = np.linalg.svd(members, full_matrices=False)
+    offset = axes[0] * singular_values[0] / np.sqrt(len(members))
+
+    return np.vstack([np.delete(centers, worst, axis=0),
+                      centers[worst] + offset,
+                      centers[worst] - offset])
+
+def _warm_sweep(X_scaled, K, scoring: dict = None) -> list:
+    """
+    Runs the k-sweep seeding each k+1 from the converged k centroids, falling
+    back to k-means++ with 10 restarts when the warm start fails (cluster
+    cannot be split, empty cluster, or SSE does not improve). A rejected
+    warm start still counts towards fits and total_iter.
+    """
+    results = []
+    previous = None
+    for k in K:
+        start = time.perf_counter()
+        kmeans, seeded, fits, total_iter = None, "k-means++", 0, 0
+        if previous is not None:
+            init = split_worst_cluster(X_scaled, previous.cluster_centers_, previous.labels_)
+            if init is not None:
+                candidate = KMeans(n_clusters=k, init=init, n_init=1, random_state=42)
+                candidate.fit(X_scaled)
+                fits, total_iter = 1, candidate.n_iter_
+                no_empty = len(np.unique(candidate.labels_)) == k
+                if no_empty and candidate.inertia_ < previous.inertia_:
+                    kmeans, seeded = candidate, "split"
+        if kmeans is None:
+            kmeans, restart_iter = fit_with_restarts(X_scaled, k)
+            fits, total_iter = fits + N_RESTARTS, total_iter + restart_iter
+        seconds = time.perf_counter() - start
+
+        score, variance = score_clustering(X_scaled, kmeans, **(scoring or {}))
+        results.append({"k": k, "sse": kmeans.inertia_, "silhouette": score, "silhouette_var": variance,
+                        "n_iter": kmeans.n_iter_, "total_iter": total_iter, "fits": fits,
+                        "seeded": seeded, "seconds": seconds})
+        previous = kmeans
+    return results
+
+def log_iterations_saved(sweep_table: pd.DataFrame, baseline_path: Path):
+    """
+    Logs the KMeans iterations a sweep saved compared with the independent
+    sweep stored at baseline_path.
+
+    The baseline is only used if it covers the same k values and was run on
+    the same data: both sweeps fit k=2 with identical seeded restarts, so
+    their k=2 SSE must match.
+    """
+    try:
+        baseline = pd.read_csv(baseline_path)
+    except FileNotFoundError:
+        baseline = None
+    same_run = (baseline is not None and "total_iter" in baseline.columns
+                and list(baseline["k"]) == list(sweep_table["k"])
+                and np.isclose(baseline["sse"].iloc[0], sweep_table["sse"].iloc[0]))
+    if not same_run:
+        logging.info("Run --sweep independent once on this data to measure the iterations saved.")
+        return
+
+    saved_iter = int(baseline["total_iter"].sum() - sweep_table["total_iter"].sum())
+    saved_seconds = baseline["seconds"].sum() - sweep_table["seconds"].sum()
+    logging.info(f"Iterations saved vs. the independent sweep: {saved_iter} "
+                 f"({baseline['total_iter'].sum()} -> {sweep_table['total_iter'].sum()}), "
+                 f"{saved_seconds:.2f} s fitting time saved.")
+    for (_, base), (_, row) in zip(baseline.iterrows(), sweep_table.iterrows()):
+        logging.info(f"  k={row['k']}: {base['total_iter']} -> {row['total_iter']} iterations, "
+                     f"{base['seconds']:.2f} s -> {row['seconds']:.2f} s")
+
+@instrumented
+def find_and_visualize_optimal_k(X_scaled: pd.DataFrame, max_k: int, out_dir: str, n_jobs: int = 1,
+                                 scoring: dict = None, sweep: str = "independent"):
     """
     Calculates SSE and Silhouette scores to find the optimal number of clusters (k)
-    and saves the elbow plot visualization.
+    and saves the elbow plot visualization (SSE, silhouette and time per k),
+    plus a per-k table (k_sweep.csv) with iterations, fits and time.
+
+    An independent sweep also keeps its table as k_sweep_independent.csv; a
+    later warm sweep on the same data compares against it to report the
+    KMeans iterations it saved.
 
     Args:
         X_scaled (pd.DataFrame): The scaled feature data.
         max_k (int): The maximum number of clusters to test.
         out_dir (str): The directory to save the elbow plot image.
+        n_jobs (int): Number of processes evaluating candidate k values
+            concurrently (-1 uses all CPUs). Ignored by the "warm" sweep.
+        scoring (dict, optional): Keyword arguments for score_clustering
+            (method, sample_size, repeats). Defaults to the exact silhouette.
+        sweep (str): "independent" fits every k from scratch with 10 restarts;
+            "warm" seeds each k+1 from the k solution (see _warm_sweep).
     """
     logging.info(f"Searching for optimal k up to {max_k} clusters...")
     sse = []
     silhouette_scores = {}
     K = range(2, max_k + 1)
 
-    for k in K:
-        kmeans = KMeans(n_clusters=k, n_init=10, random_state=42) # Set n_init explicitly
-        kmeans.fit(X_scaled)
-        sse.append(kmeans.inertia_)
-        score = silhouette_score(X_scaled, kmeans.labels_)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs, len(K)))
+
+    if sweep == "warm":
+        if n_jobs > 1:
+            logging.info("The warm-started sweep is sequential; ignoring --jobs.")
+        results = _warm_sweep(X_scaled, K, scoring)
+    elif n_jobs > 1:
+        logging.info(f"Evaluating {len(K)} candidate k values across {n_jobs} processes...")
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_sweep_worker,
+                                 initargs=(X_scaled,)) as executor:
+            results = list(executor.map(partial(_evaluate_k, scoring=scoring), K))
+    else:
+        results = [_evaluate_k(k, X_scaled, scoring) for k in K]
+
+    for r in results:
+        k, score, variance = r["k"], r["silhouette"], r["silhouette_var"]
+        sse.append(r["sse"])
         silhouette_scores[k] = score
-        logging.info(f"For k={k}, Silhouette Score is {score:.4f}")
-
-    # --- Save Elbow Plot ---
-    plt.figure(figsize=(10, 6))
-    plt.plot(K, sse, "bo-")
-    plt.xlabel("Number of Clusters (k)")
-    plt.ylabel("Sum of Squared Errors (SSE)")
-    plt.title("Elbow Method for Optimal k")
-    plt.grid(True)
+        if variance is None:
+            logging.info(f"For k={k}, Silhouette Score is {score:.4f}")
+        else:
+            logging.info(f"For k={k}, Silhouette Score is {score:.4f} (variance {variance:.6f} over samples)")
+        logging.info(f"  k={k}: {r['total_iter']} iterations over {r['fits']} fit(s), seeded by {r['seeded']}, "
+                     f"{r['seconds']:.2f} s")
+
+    total_fits = sum(r["fits"] for r in results)
+    total_iter = sum(r["total_iter"] for r in results)
+    logging.info(f"Sweep used {total_fits} KMeans fits and {total_iter} iterations (all restarts), "
+                 f"{sum(r['seconds'] for r in results):.2f} s fitting.")
+
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    sweep_table = pd.DataFrame(results)
+    sweep_table.to_csv(Path(out_dir) / "k_sweep.csv", index=False)
+    baseline_path = Path(out_dir) / "k_sweep_independent.csv"
+    if sweep == "independent":
+        sweep_table.to_csv(baseline_path, index=False)
+    else:
+        log_iterations_saved(sweep_table, baseline_path)
+
+    # --- Save Elbow Plot (with silhouette and time per k) ---
+    fig, (ax_sse, ax_sil, ax_time) = plt.subplots(3, 1, figsize=(10, 12), sharex=True)
+    ax_sse.plot(K, sse, "bo-")
+    ax_sse.set_ylabel("Sum of Squared Errors (SSE)")
+    ax_sse.set_title(f"Elbow Method for Optimal k ({sweep} sweep)")
+    ax_sse.grid(True)
+
+    ax_sil.plot(K, [silhouette_scores[k] for k in K], "go-")
+    ax_sil.set_ylabel("Silhouette Score")
+    ax_sil.grid(True)
+
+    ax_time.bar(K, sweep_table["seconds"], color="tab:orange")
+    for k, seconds, iterations in zip(K, sweep_table["seconds"], sweep_table["total_iter"]):
+        ax_time.annotate(f"{iterations} it", (k, seconds), ha="center", va="bottom", fontsize=8)
+    ax_time.set_ylabel("Fit time per k (s)")
+    ax_time.set_xlabel("Number of Clusters (k)")
+    ax_time.grid(True, axis="y")
+    fig.tight_layout()
     
     plot_path = Path(out_dir) / "elbow_plot.png"
-    plt.savefig(plot_path)
+    fig.savefig(plot_path)
     logging.info(f"Elbow method plot saved to {plot_path}")
-    plt.close() # Close the plot to prevent it from displaying in non-interactive environments
+    plt.close(fig) # Close the plot to prevent it from displaying in non-interactive environments
 
     # Log the best silhouette score
     best_k_silhouette = max(silhouette_scores, key=silhouette_scores.get)
     logging.info(f"Best k based on Silhouette Score: {best_k_silhouette} (Score: {silhouette_scores[best_k_silhouette]:.4f})")
 
 
+@instrumented
 def train_kmeans_model(X_scaled: pd.DataFrame, k: int) -> KMeans:
     """
     Trains the final KMeans model with the specified number of clusters.
@@ -114,6 +398,87 @@ def train_kmeans_model(X_scaled: pd.DataFrame, k: int) -> KMeans:
     logging.info("KMeans model training complete.")
     return model
 
+# --- Out-of-core engine (MiniBatchKMeans over chunks of rfm.csv) ---
+RFM_COLUMNS = ["Recency", "Frequency", "Monetary"]
+
+def fit_scaler_streaming(path: str, chunksize: int, sample_size: int = 50000,
+                         random_state: int = 42) -> (StandardScaler, pd.DataFrame):
+    """
+    Fits the StandardScaler incrementally over chunks of the RFM file and keeps
+    a uniform random sample of rows for the elbow search.
+
+    Args:
+        path (str): The path to the rfm.csv file.
+        chunksize (int): Rows per chunk.
+        sample_size (int): Size of the uniform sample kept in memory.
+        random_state (int): Seed for the sampling.
+
+    Returns:
+        tuple: The fitted scaler and the sampled (unscaled) RFM rows.
+    """
+    logging.info(f"Fitting scaler over {path} in chunks of {chunksize} rows...")
+    rng = np.random.default_rng(random_state)
+    scaler = StandardScaler()
+    sample = None
+    n_rows = 0
+
+    for chunk in pd.read_csv(path, usecols=RFM_COLUMNS, chunksize=chunksize):
+        scaler.partial_fit(chunk[RFM_COLUMNS])
+        n_rows += len(chunk)
+
+        # Keep the rows with the smallest random keys: a uniform sample of everything seen so far
+        chunk = chunk.assign(_key=rng.random(len(chunk)))
+        sample = chunk if sample is None else pd.concat([sample, chunk])
+        sample = sample.nsmallest(sample_size, "_key")
+
+    logging.info(f"Scaler fitted on {n_rows} rows.")
+    return scaler, sample[RFM_COLUMNS].reset_index(drop=True)
+
+def train_minibatch_kmeans_streaming(path: str, scaler: StandardScaler, k: int, chunksize: int,
+                                     epochs: int = 1) -> MiniBatchKMeans:
+    """
+    Trains MiniBatchKMeans with partial_fit over scaled chunks of the RFM file.
+
+    Args:
+        path (str): The path to the rfm.csv file.
+        scaler (StandardScaler): The fitted scaler.
+        k (int): The chosen number of clusters.
+        chunksize (int): Rows per chunk (each chunk is one mini-batch update).
+        epochs (int): Number of passes over the file.
+
+    Returns:
+        MiniBatchKMeans: The trained model.
+    """
+    logging.info(f"Training MiniBatchKMeans with k={k} over {epochs} pass(es)...")
+    model = MiniBatchKMeans(n_clusters=k, n_init=3, random_state=42) # Set n_init explicitly
+    for epoch in range(epochs):
+        for chunk in pd.read_csv(path, usecols=RFM_COLUMNS, chunksize=chunksize):
+            if len(chunk) < k and not hasattr(model, "cluster_centers_"):
+                continue  # The first update needs at least k rows to seed the centroids
+            model.partial_fit(scaler.transform(chunk[RFM_COLUMNS]))
+    logging.info("MiniBatchKMeans training complete.")
+    return model
+
+def write_clusters_streaming(path: str, scaler: StandardScaler, model, out_dir: str, chunksize: int):
+    """
+    Labels the RFM file chunk by chunk and writes rfm_with_clusters.csv.
+
+    Args:
+        path (str): The path to the rfm.csv file.
+        scaler (StandardScaler): The fitted scaler.
+        model: The trained clustering model.
+        out_dir (str): The directory to save the clustered data.
+        chunksize (int): Rows per chunk.
+    """
+    output_path = Path(out_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    out_file = output_path / "rfm_with_clusters.csv"
+
+    for i, chunk in enumerate(pd.read_csv(path, chunksize=chunksize)):
+        chunk["Cluster"] = model.predict(scaler.transform(chunk[RFM_COLUMNS]))
+        chunk.to_csv(out_file, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+    logging.info(f"Clustered data saved to {out_file}")
+
 def save_artifacts(model: KMeans, scaler: StandardScaler, rfm_df: pd.DataFrame, out_dir: str):
     """
     Saves the trained model, scaler, and the final DataFrame with cluster labels.
@@ -121,7 +486,8 @@ def save_artifacts(model: KMeans, scaler: StandardScaler, rfm_df: pd.DataFrame,
     Args:
         model (KMeans): The trained KMeans model.
         scaler (StandardScaler): The fitted scaler.
-        rfm_df (pd.DataFrame): The RFM data with the 'Cluster' column added.
+        rfm_df (pd.DataFrame): The RFM data with the 'Cluster' column added,
+            or None if it was already written (out-of-core engine).
         out_dir (str): The directory to save the artifacts.
     """
     logging.info(f"Saving artifacts to directory: {out_dir}")
@@ -133,11 +499,17 @@ def save_artifacts(model: KMeans, scaler: StandardScaler, rfm_df: pd.DataFrame,
     joblib.dump(scaler, output_path / "scaler.pkl")
 
     # Save the clustered data
-    rfm_df.to_csv(output_path / "rfm_with_clusters.csv", index=False)
+    if rfm_df is not None:
+        rfm_df.to_csv(output_path / "rfm_with_clusters.csv", index=False)
     
     logging.info("Model, scaler, and clustered data saved successfully. ✅")
 
-def training_pipeline(input_path: str, artifacts_dir: str, n_clusters: int, max_k_eval: int):
+    # Refresh the compact parameter bundle loaded by 004_app.py
+    export_model_bundle(out_dir)
+
+def training_pipeline(input_path: str, artifacts_dir: str, n_clusters: int, max_k_eval: int, n_jobs: int = 1,
+                      scoring: dict = None, engine: str = "kmeans", chunksize: int = 100000, epochs: int = 1,
+                      sweep: str = "independent", force: bool = False):
     """
     Orchestrates the full model training pipeline.
 
@@ -146,23 +518,60 @@ def training_pipeline(input_path: str, artifacts_dir: str, n_clusters: int, max_
         artifacts_dir (str): Directory to save all output artifacts.
         n_clusters (int): The number of clusters (k) for the final model.
         max_k_eval (int): The max k to evaluate for the elbow plot.
+        n_jobs (int): Number of processes for the elbow search (-1 uses all CPUs).
+        scoring (dict, optional): Silhouette settings for the elbow search
+            (see score_clustering).
+        engine (str): "kmeans" trains full-batch KMeans in memory; "minibatch"
+            streams the file and trains MiniBatchKMeans out of core.
+        chunksize (int): Rows per chunk for the "minibatch" engine.
+        epochs (int): Passes over the file for the "minibatch" engine.
+        sweep (str): "independent" or "warm" elbow search (see
+            find_and_visualize_optimal_k).
+        force (bool): Retrain even if the manifest shows the artifacts are
+            up to date for this input and these parameters.
     """
     logging.info("--- Starting Model Training Pipeline ---")
-    
-    rfm_features = load_rfm_features(input_path)
-    X_scaled, scaler = scale_features(rfm_features)
-    
-    # Hyperparameter tuning step
-    find_and_visualize_optimal_k(X_scaled, max_k=max_k_eval, out_dir=artifacts_dir)
-    
-    # Model training step
-    final_model = train_kmeans_model(X_scaled, k=n_clusters)
-    
-    # Add cluster labels to the original RFM data
-    rfm_features["Cluster"] = final_model.predict(X_scaled)
-    
-    # Save all results
-    save_artifacts(final_model, scaler, rfm_features, out_dir=artifacts_dir)
+
+    # --- Skip retraining when data and parameters are unchanged ---
+    params = {"k": n_clusters, "max_k": max_k_eval, "random_state": 42, "engine": engine,
+              "sweep": sweep, "scoring": scoring or {}}
+    if engine == "minibatch":
+        params.update({"chunksize": chunksize, "epochs": epochs})
+    cache_key = compute_cache_key(input_path, params)
+    if not force and is_up_to_date(artifacts_dir, "training", cache_key):
+        logging.info("Artifacts are up to date for this input and parameters; skipping training (use --force to retrain).")
+        return
+
+    if engine == "minibatch":
+        scaler, sample = fit_scaler_streaming(input_path, chunksize)
+
+        # The elbow search runs on the in-memory uniform sample
+        find_and_visualize_optimal_k(scaler.transform(sample), max_k=max_k_eval, out_dir=artifacts_dir,
+                                     n_jobs=n_jobs, scoring=scoring, sweep=sweep)
+
+        final_model = train_minibatch_kmeans_streaming(input_path, scaler, k=n_clusters,
+                                                       chunksize=chunksize, epochs=epochs)
+        write_clusters_streaming(input_path, scaler, final_model, artifacts_dir, chunksize)
+        save_artifacts(final_model, scaler, None, out_dir=artifacts_dir)
+    else:
+        rfm_features = load_rfm_features(input_path)
+        X_scaled, scaler = scale_features(rfm_features)
+
+        # Hyperparameter tuning step
+        find_and_visualize_optimal_k(X_scaled, max_k=max_k_eval, out_dir=artifacts_dir, n_jobs=n_jobs,
+                                     scoring=scoring, sweep=sweep)
+
+        # Model training step
+        final_model = train_kmeans_model(X_scaled, k=n_clusters)
+
+        # Add cluster labels to the original RFM data
+        rfm_features["Cluster"] = final_model.predict(X_scaled)
+
+        # Save all results
+        save_artifacts(final_model, scaler, rfm_features, out_dir=artifacts_dir)
+
+    record_run(artifacts_dir, "training", cache_key, params,
+               ["kmeans_model.pkl", "scaler.pkl", "rfm_with_clusters.csv", "elbow_plot.png", "k_sweep.csv"])
     
     logging.info("--- Model Training Pipeline Finished ---")
 
@@ -193,11 +602,95 @@ if __name__ == "__main__":
         default=10,
         help="The maximum number of clusters to evaluate for the elbow plot."
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes for the elbow search over k (-1 uses all CPUs)."
+    )
+    parser.add_argument(
+        "--silhouette",
+        type=str,
+        choices=["exact", "sampled", "simplified"],
+        default="exact",
+        help="Silhouette scoring for the elbow search: exact O(n²), stratified samples, or centroid-based O(n·k)."
+    )
+    parser.add_argument(
+        "--silhouette_sample_size",
+        type=int,
+        default=10000,
+        help="Points per sample when --silhouette sampled."
+    )
+    parser.add_argument(
+        "--silhouette_repeats",
+        type=int,
+        default=5,
+        help="Number of samples when --silhouette sampled."
+    )
+    parser.add_argument(
+        "--sweep",
+        type=str,
+        choices=["independent", "warm"],
+        default="independent",
+        help="Elbow search: fit each k from scratch, or warm-start k+1 from the k centroids."
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["kmeans", "minibatch"],
+        default="kmeans",
+        help="'kmeans' trains in memory; 'minibatch' streams rfm.csv and trains MiniBatchKMeans out of core."
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=100000,
+        help="Rows per chunk for the minibatch engine."
+    )
+    parser.add_argument(
+        "--epochs",
+        type=int,
+        default=1,
+        help="Passes over the data for the minibatch engine."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Retrain even if the artifacts are up to date for this input and parameters."
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Optional path of a JSON file to write per-stage timing and memory metrics to."
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Also record each stage's own allocation peak via tracemalloc (slower)."
+    )
     args = parser.parse_args()
 
+    if args.trace_memory:
+        enable_memory_tracing()
+
     training_pipeline(
         input_path=args.input,
         artifacts_dir=args.artifacts,
         n_clusters=args.k,
-        max_k_eval=args.max_k
+        max_k_eval=args.max_k,
+        n_jobs=args.jobs,
+        scoring={
+            "method": args.silhouette,
+            "sample_size": args.silhouette_sample_size,
+            "repeats": args.silhouette_repeats,
+        },
+        engine=args.engine,
+        chunksize=args.chunksize,
+        epochs=args.epochs,
+        sweep=args.sweep,
+        force=args.force
     )
+
+    if args.metrics:
+        write_metrics(args.metrics)
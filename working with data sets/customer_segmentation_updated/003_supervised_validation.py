@@ -2,16 +2,25 @@
 # Professional, reproducible pipeline for supervised model validation
 
 import pandas as pd
-from sklearn.model_selection import train_test_split
+import numpy as np
+from sklearn.model_selection import train_test_split, StratifiedKFold
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report, confusion_matrix
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.neighbors import NearestCentroid
+from sklearn.metrics import classification_report, confusion_matrix, f1_score
 import seaborn as sns
 import matplotlib.pyplot as plt
 import joblib
 from pathlib import Path
 import argparse
 import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from inference import export_model_bundle
+from manifest import compute_cache_key, is_up_to_date, record_run
 
 # --- Setup basic logging ---
 logging.basicConfig(
@@ -78,7 +87,118 @@ def generate_validation_artifacts(y_test, y_pred, le: LabelEncoder, out_dir: str
     plt.close()
     logging.info(f"Confusion matrix plot saved to {cm_plot_path}")
 
-def validation_pipeline(input_path: str, artifacts_dir: str, label_col: str):
+# --- Cross-validated model search ---
+# Candidate configurations compared by the stratified k-fold search
+CANDIDATES = [
+    ("logistic_regression", {"C": 0.1}),
+    ("logistic_regression", {"C": 1.0}),
+    ("logistic_regression", {"C": 10.0}),
+    ("decision_tree", {"max_depth": 3}),
+    ("decision_tree", {"max_depth": 5}),
+    ("decision_tree", {"max_depth": None}),
+    ("nearest_centroid", {}),
+]
+
+def make_classifier(name: str, params: dict):
+    """Creates an unfitted classifier for one candidate configuration."""
+    if name == "logistic_regression":
+        return LogisticRegression(max_iter=1000, random_state=42, **params)
+    if name == "decision_tree":
+        return DecisionTreeClassifier(random_state=42, **params)
+    if name == "nearest_centroid":
+        return NearestCentroid(**params)
+    raise ValueError(f"Unknown classifier: {name}")
+
+def build_fold_cache(X, y, n_folds: int) -> list:
+    """
+    Splits the data into stratified folds and scales each one once.
+
+    Args:
+        X: Feature matrix.
+        y: Encoded labels.
+        n_folds (int): Number of folds.
+
+    Returns:
+        list: One (X_train_scaled, y_train, X_val_scaled, y_val) tuple per fold,
+        shared by every candidate.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y)
+    folds = []
+    for train_idx, val_idx in StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=42).split(X, y):
+        scaler = StandardScaler()
+        folds.append((scaler.fit_transform(X[train_idx]), y[train_idx],
+                      scaler.transform(X[val_idx]), y[val_idx]))
+    return folds
+
+# Fold cache shared with the worker processes (set once per worker)
+_CV_FOLDS = None
+
+def _init_cv_worker(folds):
+    """Process-pool initializer: keeps the scaled folds in the worker."""
+    global _CV_FOLDS
+    _CV_FOLDS = folds
+
+def _score_fold(task: tuple) -> tuple:
+    """Fits one candidate on one fold and returns (candidate index, fold index, macro F1)."""
+    candidate_idx, fold_idx = task
+    X_tr, y_tr, X_val, y_val = _CV_FOLDS[fold_idx]
+    name, params = CANDIDATES[candidate_idx]
+    clf = make_classifier(name, params).fit(X_tr, y_tr)
+    return candidate_idx, fold_idx, f1_score(y_val, clf.predict(X_val), average="macro")
+
+def successive_halving_search(X, y, n_folds: int, n_jobs: int = 1) -> tuple:
+    """
+    Selects the best candidate with stratified k-fold CV and successive halving.
+
+    All surviving candidates are scored on a growing number of folds (1, 2,
+    4, ... up to n_folds); after each round the worse half is dropped. Scores
+    from earlier rounds are reused, and folds/candidates run in parallel.
+
+    Args:
+        X: Feature matrix (unscaled).
+        y: Encoded labels.
+        n_folds (int): Number of CV folds.
+        n_jobs (int): Number of worker processes (-1 uses all CPUs).
+
+    Returns:
+        tuple: The best (name, params) configuration and a DataFrame with the
+        mean/std macro F1 and number of folds evaluated for every candidate.
+    """
+    folds = build_fold_cache(X, y, n_folds)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+
+    scores = {}  # (candidate, fold) -> macro F1
+    alive = list(range(len(CANDIDATES)))
+    budget = 1
+
+    with ProcessPoolExecutor(max_workers=max(1, n_jobs), initializer=_init_cv_worker,
+                             initargs=(folds,)) as executor:
+        while True:
+            tasks = [(c, f) for c in alive for f in range(budget) if (c, f) not in scores]
+            for c, f, score in executor.map(_score_fold, tasks):
+                scores[(c, f)] = score
+
+            mean_score = {c: np.mean([scores[(c, f)] for f in range(budget)]) for c in alive}
+            logging.info(f"CV round with {budget} fold(s): " + ", ".join(
+                f"{CANDIDATES[c][0]}{CANDIDATES[c][1]}={mean_score[c]:.4f}" for c in alive))
+            if len(alive) == 1 or budget == n_folds:
+                break
+            alive = sorted(alive, key=mean_score.get, reverse=True)[:math.ceil(len(alive) / 2)]
+            budget = min(budget * 2, n_folds)
+
+    best = max(alive, key=mean_score.get)
+    rows = []
+    for c, (name, params) in enumerate(CANDIDATES):
+        fold_scores = [score for (ci, _), score in scores.items() if ci == c]
+        rows.append({"model": name, "params": params, "folds": len(fold_scores),
+                     "mean_f1_macro": np.mean(fold_scores), "std_f1_macro": np.std(fold_scores),
+                     "selected": c == best})
+    return CANDIDATES[best], pd.DataFrame(rows)
+
+def validation_pipeline(input_path: str, artifacts_dir: str, label_col: str, force: bool = False,
+                        cv_folds: int = 0, n_jobs: int = 1):
     """
     Orchestrates the full supervised validation pipeline.
 
@@ -86,8 +206,22 @@ def validation_pipeline(input_path: str, artifacts_dir: str, label_col: str):
         input_path (str): Path to the labeled input CSV.
         artifacts_dir (str): Directory to save all output artifacts.
         label_col (str): The name of the column containing the labels.
+        force (bool): Refit even if the manifest shows the artifacts are up
+            to date for this input and these parameters.
+        cv_folds (int): If greater than 1, pick the classifier with a
+            stratified k-fold search over CANDIDATES on the training split;
+            otherwise fit a single Logistic Regression as before.
+        n_jobs (int): Worker processes for the CV search (-1 uses all CPUs).
     """
     logging.info("--- Starting Supervised Validation Pipeline ---")
+
+    # --- Skip refitting when data and parameters are unchanged ---
+    params = {"label_col": label_col, "test_size": 0.2, "random_state": 42, "cv_folds": cv_folds,
+              "model": "LogisticRegression" if cv_folds <= 1 else "search"}
+    cache_key = compute_cache_key(input_path, params)
+    if not force and is_up_to_date(artifacts_dir, "validation", cache_key):
+        logging.info("Artifacts are up to date for this input and parameters; skipping validation (use --force to refit).")
+        return
     
     # --- Data Preparation ---
     df = load_labeled_data(input_path)
@@ -106,8 +240,16 @@ def validation_pipeline(input_path: str, artifacts_dir: str, label_col: str):
     X_test_scaled = scaler.transform(X_test)
 
     # --- Model Training ---
-    logging.info("Training Logistic Regression classifier...")
-    clf = LogisticRegression(max_iter=1000, random_state=42)
+    if cv_folds > 1:
+        logging.info(f"Searching {len(CANDIDATES)} candidate models with {cv_folds}-fold stratified CV...")
+        (name, model_params), cv_results = successive_halving_search(X_train, y_train, cv_folds, n_jobs)
+        Path(artifacts_dir).mkdir(parents=True, exist_ok=True)
+        cv_results.to_csv(Path(artifacts_dir) / "cv_results.csv", index=False)
+        logging.info(f"Selected {name} {model_params}; CV results saved to {Path(artifacts_dir) / 'cv_results.csv'}")
+        clf = make_classifier(name, model_params)
+    else:
+        logging.info("Training Logistic Regression classifier...")
+        clf = LogisticRegression(max_iter=1000, random_state=42)
     clf.fit(X_train_scaled, y_train)
     logging.info("Classifier training complete.")
 
@@ -122,6 +264,13 @@ def validation_pipeline(input_path: str, artifacts_dir: str, label_col: str):
     joblib.dump(scaler, Path(artifacts_dir) / "supervised_scaler.pkl")
     joblib.dump(le, Path(artifacts_dir) / "label_encoder.pkl")
     logging.info("Supervised artifacts saved successfully. ✅")
+
+    # Refresh the compact parameter bundle loaded by 004_app.py
+    export_model_bundle(artifacts_dir)
+
+    record_run(artifacts_dir, "validation", cache_key, params,
+               ["supervised_model.pkl", "supervised_scaler.pkl", "label_encoder.pkl",
+                "classification_report.txt", "confusion_matrix.png"])
     
     logging.info("--- Supervised Validation Pipeline Finished ---")
 
@@ -139,10 +288,30 @@ if __name__ == "__main__":
         default="artifacts",
         help="Directory to save validation artifacts."
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Refit even if the artifacts are up to date for this input and parameters."
+    )
+    parser.add_argument(
+        "--cv_folds",
+        type=int,
+        default=0,
+        help="Select the classifier with stratified k-fold CV over several candidates (0 keeps the single Logistic Regression)."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes for the CV search (-1 uses all CPUs)."
+    )
     args = parser.parse_args()
 
     validation_pipeline(
         input_path=args.input,
         artifacts_dir=args.artifacts,
-        label_col="segments"
+        label_col="segments",
+        force=args.force,
+        cv_folds=args.cv_folds,
+        n_jobs=args.jobs
     )
@@ -5,80 +5,175 @@ import dash
 from dash import dcc, html, dash_table
 from dash_extensions.enrich import Output, Input, dcc, State
 import pandas as pd 
+import numpy as np
 import joblib
 from pathlib import Path
 import plotly.express as px
 import base64
 import io
-from io import StringIO
+import hashlib
+import json
+import math
+import os
 
 from dash import ctx
+from dash.dependencies import ClientsideFunction
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 import tempfile
 
+from ingest import infer_csv_date_format, infer_date_format
+from rfm_utils import aggregate_rfm
+from inference import BUNDLE_NAME, PredictionLattice, SegmentModel, artifact_hashes
+from app_cache import CustomerIndex, ResultCache
+from upload_spool import UploadSpool, UploadTooLarge
+from manifest import file_sha256
+from flask import request
+
 # --- Load Artifacts ---
+# Prefer the memory-mapped parameter bundle; fall back to the joblib pickles.
+# When the pickles are present the bundle must have been compiled from them.
+segment_model = None
 try:
-    artifacts = {
-        "kmeans_model": joblib.load("artifacts/kmeans_model.pkl"),
-        "scaler": joblib.load("artifacts/scaler.pkl"),
-        "supervised_model": joblib.load("artifacts/supervised_model.pkl"),
-        "supervised_scaler": joblib.load("artifacts/supervised_scaler.pkl"),
-        "label_encoder": joblib.load("artifacts/label_encoder.pkl"),
-    }
-    artifacts_loaded = True
-except FileNotFoundError:
-    artifacts_loaded = False
+    segment_model = SegmentModel.load(Path("artifacts") / BUNDLE_NAME,
+                                      expected_sources=artifact_hashes("artifacts"))
+except (FileNotFoundError, ValueError):
+    try:
+        artifacts = {
+            "kmeans_model": joblib.load("artifacts/kmeans_model.pkl"),
+            "scaler": joblib.load("artifacts/scaler.pkl"),
+            "supervised_model": joblib.load("artifacts/supervised_model.pkl"),
+            "supervised_scaler": joblib.load("artifacts/supervised_scaler.pkl"),
+            "label_encoder": joblib.load("artifacts/label_encoder.pkl"),
+        }
+        # Fold the scalers, centroids and classifier into one vectorized predictor
+        segment_model = SegmentModel.from_artifacts(artifacts)
+    except FileNotFoundError:
+        pass
+artifacts_loaded = segment_model is not None
+
+# --- Background job manager (PDF reports) ---
+# Jobs run in separate processes with their state in a local diskcache;
+# without diskcache installed, reports are built in the request thread.
+try:
+    import diskcache
+    background_callback_manager = dash.DiskcacheManager(diskcache.Cache("artifacts/cache/dash_jobs"))
+except ImportError:
+    background_callback_manager = None
 
 # --- Initialize the Dash App ---
-app = dash.Dash(__name__, suppress_callback_exceptions=True)
+app = dash.Dash(__name__, suppress_callback_exceptions=True,
+                background_callback_manager=background_callback_manager)
 server = app.server
 
+# --- Server-side results cache ---
+# Upload results stay on the server; the browser session only holds their key.
+# Keys include the model version, so retrained artifacts never serve stale predictions.
+# The cache lives in this process's memory: run the app as a single server process
+# (app.run, or e.g. gunicorn --workers 1 --threads N). With several workers, requests
+# that land on another worker than the upload find no results and report them expired.
+results_cache = ResultCache(max_bytes=512 * 1024 * 1024, ttl_seconds=2 * 60 * 60)
+
+# Memo of processed uploads (content hash -> results), with its own counters so
+# re-upload hits are not mixed with the table/drill-down/export lookups above.
+# It holds the same DataFrame objects as results_cache, not copies.
+upload_memo = ResultCache(max_bytes=512 * 1024 * 1024, ttl_seconds=2 * 60 * 60)
+
+def artifact_version(artifacts_dir: str = "artifacts") -> str:
+    """
+    Hashes the contents of the model files the app predicts with: the pickles
+    (including non-linear classifiers that the bundle cannot hold), or the
+    bundle alone when it is deployed without them.
+    """
+    sources = artifact_hashes(artifacts_dir)
+    if sources is None:
+        bundle_path = Path(artifacts_dir) / BUNDLE_NAME
+        if not bundle_path.exists():
+            return "none"
+        sources = {BUNDLE_NAME: file_sha256(bundle_path)}
+    return hashlib.sha256(json.dumps(sources, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+ARTIFACT_VERSION = artifact_version() if artifacts_loaded else "none"
+
+# Per-upload customer ID indexes for the drill-down search, keyed like the results
+customer_index_cache = ResultCache(max_bytes=128 * 1024 * 1024, ttl_seconds=2 * 60 * 60)
+
+def upload_key(contents: str) -> str:
+    """Identifies an upload by a hash of its bytes (base64) and the artifact version."""
+    digest = hashlib.sha256(contents.split(',', 1)[-1].encode("utf-8"))
+    digest.update(ARTIFACT_VERSION.encode("utf-8"))
+    return digest.hexdigest()
+
+@server.route("/cache-stats")
+def cache_stats():
+    """Exposes the upload memo and results cache hit/miss counters as JSON."""
+    return {"uploads": upload_memo.stats(), "results": results_cache.stats()}
+
+# --- Chunked large-file uploads ---
+# assets/chunked_upload.js sends files in slices to these routes; the spooled
+# file is then segmented from disk (see predict_segments_from_file).
+upload_spool = UploadSpool("artifacts/cache/uploads", max_bytes=20 * 1024 ** 3)
+SPOOL_MAX_AGE_SECONDS = 24 * 60 * 60
+
+@server.route("/upload/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Returns the bytes received so far, so the client can resume."""
+    try:
+        return {"offset": upload_spool.offset(upload_id)}
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+@server.route("/upload/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    """Appends one chunk (raw request body) at the ?offset= position."""
+    try:
+        offset = upload_spool.append(upload_id, int(request.args.get("offset", 0)), request.stream)
+    except UploadTooLarge as e:
+        # The file can never fit, so drop what was received and tell the client to stop
+        upload_spool.remove(upload_id)
+        return {"error": str(e)}, 413
+    except ValueError as e:
+        return {"error": str(e), "offset": upload_spool.offset(upload_id)}, 409
+    return {"offset": offset}
+
+@server.route("/upload/<upload_id>/complete", methods=["POST"])
+def upload_complete(upload_id):
+    """Marks the upload as finished; the Explore page then processes it."""
+    filename = (request.get_json(silent=True) or {}).get("filename", "upload.csv")
+    try:
+        upload_spool.complete(upload_id, filename)
+    except (ValueError, FileNotFoundError) as e:
+        return {"error": str(e)}, 400
+    upload_spool.purge_stale(SPOOL_MAX_AGE_SECONDS)
+    return {"upload_id": upload_id, "filename": filename}
+
 # --- Helper Functions ---
 
 #start of predict section 
 def predict_segments(df):
     df_copy = df.copy()
 
-    # Normalize column names (remove spaces, lower case for detection)
+    # Normalize column names (remove spaces)
     df_copy.columns = [col.strip() for col in df_copy.columns]
-    cols_lower = [c.lower() for c in df_copy.columns]
 
     # --- Auto-detect transactional data (more flexible) ---
-    has_raw_data = (
-        any('invoice' in c for c in cols_lower) and
-        any('date' in c for c in cols_lower) and
-        any('customer' in c for c in cols_lower) and
-        any('quantity' in c for c in cols_lower) and
-        any(('price' in c or 'amount' in c or 'sales' in c) for c in cols_lower)
-    )
+    raw_cols = detect_transaction_columns(df_copy.columns)
+    has_raw_data = raw_cols is not None
 
     if has_raw_data:
-        # Map column names dynamically
-        invoice_col = next(c for c in df_copy.columns if 'invoice' in c.lower())
-        date_col = next(c for c in df_copy.columns if 'date' in c.lower())
-        cust_col = next(c for c in df_copy.columns if 'customer' in c.lower())
-        qty_col = next(c for c in df_copy.columns if 'quantity' in c.lower())
-        price_col = next(c for c in df_copy.columns if any(x in c.lower() for x in ['price', 'amount', 'sales']))
-
-        # Clean and compute totals
-        df_copy.dropna(subset=[cust_col], inplace=True)
-        df_copy = df_copy[df_copy[qty_col] > 0]
-        df_copy['TotalPrice'] = df_copy[qty_col] * df_copy[price_col]
-
-        # Parse dates safely
-        df_copy[date_col] = pd.to_datetime(df_copy[date_col], errors='coerce')
+        invoice_col, date_col, cust_col = raw_cols['invoice'], raw_cols['date'], raw_cols['customer']
+        df_copy = clean_raw_transactions(df_copy, raw_cols)
 
         # --- Compute RFM metrics ---
         latest_date = df_copy[date_col].max()
-        rfm = df_copy.groupby(cust_col).agg({
-            date_col: lambda x: (latest_date - x.max()).days,
-            invoice_col: 'nunique',
-            'TotalPrice': 'sum'
-        }).reset_index()
-
-        rfm.columns = ['CustomerID', 'Recency', 'Frequency', 'Monetary']
-        df_copy = rfm
+        df_copy = aggregate_rfm(
+            df_copy,
+            customer_col=cust_col,
+            date_col=date_col,
+            invoice_col=invoice_col,
+            amount_col='TotalPrice',
+            reference_date=latest_date
+        )
 
     else:
         # Expect that Recency, Frequency, Monetary already exist
@@ -90,17 +185,158 @@ def predict_segments(df):
                 "or precomputed RFM columns (Recency, Frequency, Monetary)."
             )
 
+    return predict_rfm(df_copy)
+
+def detect_transaction_columns(columns):
+    """
+    Maps the roles of raw transactional data to column names.
+
+    Returns:
+        dict: Column per role ('invoice', 'date', 'customer', 'quantity',
+        'price'), or None if the columns do not look like raw transactions.
+    """
+    cols_lower = [c.lower() for c in columns]
+    has_raw_data = (
+        any('invoice' in c for c in cols_lower) and
+        any('date' in c for c in cols_lower) and
+        any('customer' in c for c in cols_lower) and
+        any('quantity' in c for c in cols_lower) and
+        any(('price' in c or 'amount' in c or 'sales' in c) for c in cols_lower)
+    )
+    if not has_raw_data:
+        return None
+
+    # Map column names dynamically
+    return {
+        'invoice': next(c for c in columns if 'invoice' in c.lower()),
+        'date': next(c for c in columns if 'date' in c.lower()),
+        'customer': next(c for c in columns if 'customer' in c.lower()),
+        'quantity': next(c for c in columns if 'quantity' in c.lower()),
+        'price': next(c for c in columns if any(x in c.lower() for x in ['price', 'amount', 'sales'])),
+    }
+
+def clean_raw_transactions(df, raw_cols, date_format=None):
+    """
+    Drops unusable rows, adds TotalPrice and parses the date column.
+
+    Args:
+        df (pd.DataFrame): Raw transactions.
+        raw_cols (dict): Column roles from detect_transaction_columns.
+        date_format (str): Format of the date column; inferred from df if None.
+    """
+    cust_col, qty_col, price_col, date_col = raw_cols['customer'], raw_cols['quantity'], raw_cols['price'], raw_cols['date']
+    if date_format is None:
+        date_format = infer_date_format(df[date_col])
+
+    # Clean and compute totals
+    df = df.dropna(subset=[cust_col])
+    df = df[df[qty_col] > 0].copy()
+    df['TotalPrice'] = df[qty_col] * df[price_col]
+
+    # Parse dates safely
+    df[date_col] = pd.to_datetime(df[date_col], format=date_format, errors='coerce')
+    return df
+
+def predict_segments_from_file(path, filename: str, chunksize: int = 500_000):
+    """
+    Segments an uploaded file straight from disk.
+
+    Raw transactions are read in chunks and folded into per-customer partial
+    aggregates (last purchase, spend, distinct invoices), so memory grows with
+    the number of customers rather than with the file size. Precomputed RFM
+    files are predicted chunk by chunk. Excel files are read whole.
+
+    Args:
+        path: Path of the spooled upload.
+        filename (str): Original file name (decides CSV vs Excel).
+        chunksize (int): CSV rows per chunk.
+
+    Returns:
+        tuple: The results DataFrame and whether raw transactions were detected.
+    """
+    if filename.endswith(('.xls', '.xlsx')):
+        df = pd.read_excel(path)
+        return predict_segments(df), detect_transaction_columns([c.strip() for c in df.columns]) is not None
+    return _predict_segments_csv(path, chunksize, encoding=detect_text_encoding(path))
+
+def detect_text_encoding(path, sample_bytes: int = 1 << 20) -> str:
+    """
+    Chooses UTF-8 or latin1 for a CSV from a leading sample of its bytes, so
+    the file is read once with a fixed encoding instead of being re-read
+    after a late decode error.
+    """
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still UTF-8
+        if e.start < len(sample) - 3:
+            return 'latin1'
+    return 'utf-8'
+
+def _predict_segments_csv(path, chunksize: int, encoding: str):
+    # Invalid bytes after the sample are replaced rather than aborting the pass
+    read_options = {'encoding': encoding, 'encoding_errors': 'replace'}
+    header = pd.read_csv(path, nrows=0, **read_options).columns
+    columns = [col.strip() for col in header]
+    raw_cols = detect_transaction_columns(columns)
+
+    if raw_cols is None:
+        # Precomputed RFM rows are independent, so each chunk is predicted on its own
+        parts = [predict_segments(chunk) for chunk in pd.read_csv(path, chunksize=chunksize, **read_options)]
+        return pd.concat(parts, ignore_index=True), False
+
+    cust_col, date_col, invoice_col = raw_cols['customer'], raw_cols['date'], raw_cols['invoice']
+    # Read IDs as text so every chunk produces the same keys
+    id_dtypes = {header[columns.index(col)]: str for col in (cust_col, invoice_col)}
+
+    partial = None       # Per-customer LastPurchase / Monetary
+    invoice_pairs = []   # Distinct (customer, invoice) pairs per chunk
+    # One date format for every chunk, from a scan of the date column alone
+    date_format = infer_csv_date_format(path, column=header[columns.index(date_col)],
+                                        chunksize=chunksize, **read_options)
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=id_dtypes, **read_options):
+        chunk.columns = columns
+        chunk = clean_raw_transactions(chunk, raw_cols, date_format)
+        if chunk.empty:
+            continue
+
+        grouped = chunk.groupby(cust_col).agg(
+            LastPurchase=(date_col, 'max'),
+            Monetary=('TotalPrice', 'sum'),
+        )
+        if partial is None:
+            partial = grouped
+        else:
+            partial = pd.concat([partial, grouped]).groupby(level=0).agg(
+                {'LastPurchase': 'max', 'Monetary': 'sum'}
+            )
+        invoice_pairs.append(chunk[[cust_col, invoice_col]].dropna().drop_duplicates())
+
+    if partial is None:
+        raise ValueError("No valid transactions found in the uploaded file.")
+
+    frequency = pd.concat(invoice_pairs).drop_duplicates().groupby(cust_col).size()
+    latest_date = partial['LastPurchase'].max()
+    rfm = pd.DataFrame({
+        'CustomerID': partial.index,
+        'Recency': (latest_date - partial['LastPurchase']).dt.days.values,
+        'Frequency': frequency.reindex(partial.index, fill_value=0).values,
+        'Monetary': partial['Monetary'].values,
+    })
+    return predict_rfm(rfm), True
+
+def predict_rfm(df_copy):
+    """Predicts Cluster and Segment for a DataFrame with RFM columns."""
     # --- Drop missing or invalid values before prediction ---
     df_copy = df_copy.dropna(subset=["Recency", "Frequency", "Monetary"])
     df_copy = df_copy[(df_copy["Recency"] >= 0) & (df_copy["Frequency"] > 0) & (df_copy["Monetary"] > 0)]
 
-    # --- Predict segments ---
-    X_scaled = artifacts["scaler"].transform(df_copy[["Recency", "Frequency", "Monetary"]])
-    df_copy["Cluster"] = artifacts["kmeans_model"].predict(X_scaled)
-
-    X_scaled_sup = artifacts["supervised_scaler"].transform(df_copy[["Recency", "Frequency", "Monetary"]])
-    seg_pred = artifacts["supervised_model"].predict(X_scaled_sup)
-    df_copy["Segment"] = artifacts["label_encoder"].inverse_transform(seg_pred)
+    # --- Predict segments (single fused pass, see inference.SegmentModel) ---
+    clusters, segments = segment_model.predict(df_copy[["Recency", "Frequency", "Monetary"]].to_numpy())
+    df_copy["Cluster"] = clusters
+    df_copy["Segment"] = segments
 
     return df_copy
 
@@ -163,15 +399,49 @@ def build_explore_layout():
             style={'width': '100%', 'height': 'auto', 'lineHeight': '60px', 'borderWidth': '0', 'borderRadius': '15px'},
             multiple=False
         ),
+        # --- Large files: sent in resumable chunks by assets/chunked_upload.js ---
+        html.Div([
+            html.Label("Large file (CSV or Excel, streamed to the server in chunks): "),
+            html.Input(id='large-upload-input', type='file', accept='.csv,.xls,.xlsx'),
+            html.Div(id='large-upload-status', style={'marginTop': '8px', 'color': '#666'}),
+            dcc.Store(id='large-upload-done'),
+        ], style={'textAlign': 'center', 'marginTop': '15px'}),
         html.Hr(),
         dcc.Store(id='stored-results-data', storage_type='session'),
         dcc.Download(id="download-pdf"),
+        dcc.Download(id="download-results"),
 
         html.Div(id='explore-output-container'),
         html.Div(id='customer-drilldown-section', style={'display': 'none'})
     ])
 #adding live atbles for single prection 
 
+# Slider (min, max, step); the prediction lattice is built over the same grid
+RECENCY_RANGE = (0, 200, 1)
+FREQUENCY_RANGE = (1, 50, 1)
+MONETARY_RANGE = (100, 10000, 100)
+
+# Typical RFM profiles shown on the radar chart for comparison
+WHATIF_PROFILES = {
+    "VIP": [20, 30, 7000],
+    "Regular": [60, 10, 2000],
+    "Low-Engaged": [120, 5, 800],
+    "Churned": [180, 1, 200]
+}
+
+# The What-If page predicts in the browser (assets/whatif.js) unless the
+# supervised model cannot be exported or WHATIF_MODE=server is set
+CLIENTSIDE_WHATIF = (
+    artifacts_loaded and segment_model.supervised is None
+    and os.environ.get("WHATIF_MODE", "client") != "server"
+)
+
+def whatif_model_params():
+    """Model parameters and radar profiles for the clientside What-If callback."""
+    if not CLIENTSIDE_WHATIF:
+        return None
+    return {"model": segment_model.to_dict(), "profiles": WHATIF_PROFILES}
+
 def build_predict_layout():
     return html.Div([
         html.H1("🔮 Single Customer Prediction"),
@@ -181,24 +451,25 @@ def build_predict_layout():
         html.Div([
             html.Div([
                 html.Label("Recency (days)"),
-                dcc.Slider(id='recency-slider', min=0, max=200, step=1, value=50,
+                dcc.Slider(id='recency-slider', min=RECENCY_RANGE[0], max=RECENCY_RANGE[1], step=RECENCY_RANGE[2], value=50,
                            marks={0:'0', 50:'50', 100:'100', 150:'150', 200:'200'})
             ], style={'width': '30%', 'padding': '10px'}),
 
             html.Div([
                 html.Label("Frequency (orders)"),
-                dcc.Slider(id='frequency-slider', min=1, max=50, step=1, value=5,
+                dcc.Slider(id='frequency-slider', min=FREQUENCY_RANGE[0], max=FREQUENCY_RANGE[1], step=FREQUENCY_RANGE[2], value=5,
                            marks={1:'1', 10:'10', 20:'20', 30:'30', 50:'50'})
             ], style={'width': '30%', 'padding': '10px'}),
 
             html.Div([
                 html.Label("Monetary (spend)"),
-                dcc.Slider(id='monetary-slider', min=100, max=10000, step=100, value=1000,
+                dcc.Slider(id='monetary-slider', min=MONETARY_RANGE[0], max=MONETARY_RANGE[1], step=MONETARY_RANGE[2], value=1000,
                            marks={100:'100', 2000:'2k', 5000:'5k', 8000:'8k', 10000:'10k'})
             ], style={'width': '30%', 'padding': '10px'})
         ], style={'display': 'flex', 'justifyContent': 'space-around'}),
 
         html.Hr(),
+        dcc.Store(id='whatif-model-params', data=whatif_model_params()),
 
         html.Div(id='prediction-output', style={'fontSize': 26, 'fontWeight': 'bold', 'textAlign': 'center', 'marginTop': '20px'}),
 
@@ -355,153 +626,98 @@ def toggle_sidebar(show_clicks, hide_clicks):
     [Output('explore-output-container', 'children'),
      Output('customer-drilldown-section', 'style'),
      Output('stored-results-data', 'data')],
-    Input('upload-data', 'contents'),
+    [Input('upload-data', 'contents'),
+     Input('large-upload-done', 'data')],
     State('upload-data', 'filename')
 )
-def update_explore_page(contents, filename):
+def update_explore_page(contents, large_upload, filename):
+    if ctx.triggered_id == 'large-upload-done':
+        return process_spooled_upload(large_upload)
+
     if contents is None:
         return dash.no_update, {'display': 'none'}, None
 
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
+    if not filename.endswith(('.csv', '.xls', '.xlsx')):
+        return (
+            html.Div(["❌ Unsupported file type. Please upload a CSV or Excel file."]),
+            {'display': 'none'},
+            None
+        )
 
     try:
-        # --- Handle different file types and encodings ---
-        if filename.endswith('.csv'):
-            try:
-                df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
-            except UnicodeDecodeError:
-                df = pd.read_csv(io.StringIO(decoded.decode('latin1')))
-        elif filename.endswith(('.xls', '.xlsx')):
-            df = pd.read_excel(io.BytesIO(decoded))
-        else:
+        # --- Re-uploads of the same file are served from the cache ---
+        results_key = upload_key(contents)
+        results = upload_memo.get(results_key)
+
+        if results is None:
+            content_type, content_string = contents.split(',')
+            decoded = base64.b64decode(content_string)
+
+            # --- Handle different file types and encodings ---
+            if filename.endswith('.csv'):
+                try:
+                    df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
+                except UnicodeDecodeError:
+                    df = pd.read_csv(io.StringIO(decoded.decode('latin1')))
+            else:
+                df = pd.read_excel(io.BytesIO(decoded))
+
+            # --- Perform prediction or RFM computation ---
+            results = predict_segments(df)
+
+            # --- Show message based on detected data type ---
+            msg = "✅ Data loaded successfully and segmented."
+            if {'InvoiceNo', 'InvoiceDate', 'CustomerID', 'Quantity', 'UnitPrice'}.issubset(set(df.columns)):
+                msg = "📊 Detected raw transactional data — RFM metrics calculated automatically."
+            results.attrs["upload_message"] = msg
+            upload_memo.put(results_key, results)
+
+        results_cache.put(results_key, results)
+        return render_explore_results(results, results_key, filename)
+
+    except Exception as e:
+        # Always return 3 values even on error
+        return (
+            html.Div([
+                html.H3("⚠️ Error processing file", style={'color': 'red'}),
+                html.P(str(e))
+            ]),
+            {'display': 'none'},
+            None
+        )
+
+def process_spooled_upload(large_upload):
+    """Segments a file received through the chunked /upload routes."""
+    if not large_upload:
+        return dash.no_update, {'display': 'none'}, None
+    upload_id = large_upload.get('upload_id')
+
+    try:
+        path, filename = upload_spool.completed(upload_id)
+        if not filename.endswith(('.csv', '.xls', '.xlsx')):
             return (
                 html.Div(["❌ Unsupported file type. Please upload a CSV or Excel file."]),
                 {'display': 'none'},
                 None
             )
 
-        # --- Perform prediction or RFM computation ---
-        results = predict_segments(df)
-
-        # --- Show message based on detected data type ---
-        msg = "✅ Data loaded successfully and segmented."
-        if {'InvoiceNo', 'InvoiceDate', 'CustomerID', 'Quantity', 'UnitPrice'}.issubset(set(df.columns)):
-            msg = "📊 Detected raw transactional data — RFM metrics calculated automatically."
-
-       # --- Prepare visuals or summary sections ---
-
-
-        # --- Generate quick summary KPIs ---
-        summary_cards = html.Div([
-            html.Div([
-                html.H4("🧍 Total Customers", style={'color': '#f73600'}),
-                html.H3(f"{len(results):,}")
-            ], className="summary-card"),
-            html.Div([
-                html.H4("💸 Avg Monetary Value", style={'color': '#f73600'}),
-                html.H3(f"${results['Monetary'].mean():,.2f}")
-            ], className="summary-card"),
-            html.Div([
-                html.H4("🔁 Avg Frequency", style={'color': '#f73600'}),
-                html.H3(f"{results['Frequency'].mean():.2f}")
-            ], className="summary-card"),
-            html.Div([
-                html.H4("⏰ Avg Recency", style={'color': '#f73600'}),
-                html.H3(f"{results['Recency'].mean():.2f}")
-            ], className="summary-card"),
-            html.Div([
-                html.H4("🧩 Segments Found", style={'color': '#f73600'}),
-                html.H3(f"{results['Segment'].nunique()}")
-            ], className="summary-card"),
-        ], style={
-            'display': 'grid',
-            'gridTemplateColumns': 'repeat(auto-fit, minmax(180px, 1fr))',
-            'gap': '20px',
-            'marginBottom': '30px',
-            'textAlign': 'center'
-        })
-
-        # --- Prepare visuals ---
-        drilldown_style = {'display': 'block', 'marginTop': '30px'}
-
-
-        #summary section ended 
-
-        output_container = html.Div([
-            html.H2("📊 Customer Segmentation Analysis", style={'textAlign': 'center', 'color': '#f73600'}),
-            html.H4(f"Uploaded File: {filename}", style={'textAlign': 'center'}),
-            summary_cards,
-            html.P(msg, style={'color': 'green', 'textAlign': 'center'}),
-            html.P(msg, style={'color': 'green', 'textAlign': 'center'}),
-
-            # --- Add PDF download button ---
-            html.Div([
-                html.Button("📄 Download Report (PDF)", id='btn-download-pdf', n_clicks=0, className='button')
-            ], style={'textAlign': 'center', 'marginBottom': '20px'}),
-
-            # --- Data table ---
-            dash_table.DataTable(
-                data=results.to_dict('records'),
-                page_size=10,
-                style_header={
-                    'backgroundColor': '#f73600',
-                    'color': '#fff9d3',
-                    'textAlign': 'center',
-                    'fontWeight': 'bold'
-                },
-                style_cell={
-                    'textAlign': 'center',
-                    'verticalAlign': 'middle',
-                    'padding': '8px'
-                },
-            ),
-
-            html.Hr(),
-            html.H3("📈 Visualizations", style={'textAlign': 'center'}),
-            html.Div([
-                #3d scater plot chart 
-                dcc.Graph(
-                    figure=px.pie(
-                        results, 
-                        names='Segment', 
-                        title='Segment Distribution'
-                    )
-                ),
-                dcc.Graph(
-                    figure=px.bar(
-                        results.groupby("Segment")[["Recency", "Frequency", "Monetary"]]
-                        .mean().reset_index(),
-                        x="Segment", 
-                        y=["Recency", "Frequency", "Monetary"], 
-                        barmode='group',
-                        title='Average RFM Values per Segment'
-                    )
-                ),
-                dcc.Graph(
-                    figure=px.scatter_3d(
-                        results,
-                        x='Recency',
-                        y='Frequency',
-                        z='Monetary',
-                        color='Segment',
-                        size='Monetary',
-                        title='3D Customer Segments Visualization',
-                        hover_data=['Segment']
-                    )
-                )
-
-                #end 3d scater plot chart 
-            ], style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'space-around'}),
-        ])
-
-
-        #" going to repalce for adding dowmload report option"
-
-        return output_container, drilldown_style, results.to_json(date_format='iso', orient='split')
+        # Same key scheme as upload_key, hashed from disk
+        results_key = hashlib.sha256(f"{file_sha256(path)}:{ARTIFACT_VERSION}".encode("utf-8")).hexdigest()
+        results = upload_memo.get(results_key)
+        if results is None:
+            results, has_raw_data = predict_segments_from_file(path, filename)
+            msg = "✅ Data loaded successfully and segmented."
+            if has_raw_data:
+                msg = "📊 Detected raw transactional data — RFM metrics calculated automatically."
+            results.attrs["upload_message"] = msg
+            upload_memo.put(results_key, results)
+
+        results_cache.put(results_key, results)
+        # The results are cached, so the spooled copy is no longer needed
+        upload_spool.remove(upload_id)
+        return render_explore_results(results, results_key, filename)
 
     except Exception as e:
-        # Always return 3 values even on error
         return (
             html.Div([
                 html.H3("⚠️ Error processing file", style={'color': 'red'}),
@@ -511,131 +727,409 @@ def update_explore_page(contents, filename):
             None
         )
 
-#new code blck 2  ends here
-#new code block 
-
-        output_container = html.Div([
-            html.H2("📊 Customer Segmentation Analysis", style={'textAlign': 'center', 'color': '#f73600'}),
-            html.H4(f"Uploaded File: {filename}", style={'textAlign': 'center'}),
-            dash_table.DataTable(
-                data=results.to_dict('records'),
-                page_size=10,
-                style_header={
-                    'backgroundColor': '#f73600',
-                    'color': '#fff9d3',
-                    'textAlign': 'center',
-                    'fontWeight': 'bold'
-                },
-                style_cell={
-                    'textAlign': 'center',
-                    'verticalAlign': 'middle',
-                    'padding': '8px',
-                    'whiteSpace': 'normal',
-                },
+def render_explore_results(results, results_key, filename):
+    """Builds the Explore page output (KPIs, table, charts) for cached results."""
+    msg = results.attrs.get("upload_message", "✅ Data loaded successfully and segmented.")
+
+    # The PDF job may run in another process, so it reads its inputs from disk
+    save_report_inputs(results, results_key)
+
+    # --- Prepare visuals or summary sections ---
+
+
+    # --- Generate quick summary KPIs ---
+    summary_cards = html.Div([
+        html.Div([
+            html.H4("🧍 Total Customers", style={'color': '#f73600'}),
+            html.H3(f"{len(results):,}")
+        ], className="summary-card"),
+        html.Div([
+            html.H4("💸 Avg Monetary Value", style={'color': '#f73600'}),
+            html.H3(f"${results['Monetary'].mean():,.2f}")
+        ], className="summary-card"),
+        html.Div([
+            html.H4("🔁 Avg Frequency", style={'color': '#f73600'}),
+            html.H3(f"{results['Frequency'].mean():.2f}")
+        ], className="summary-card"),
+        html.Div([
+            html.H4("⏰ Avg Recency", style={'color': '#f73600'}),
+            html.H3(f"{results['Recency'].mean():.2f}")
+        ], className="summary-card"),
+        html.Div([
+            html.H4("🧩 Segments Found", style={'color': '#f73600'}),
+            html.H3(f"{results['Segment'].nunique()}")
+        ], className="summary-card"),
+    ], style={
+        'display': 'grid',
+        'gridTemplateColumns': 'repeat(auto-fit, minmax(180px, 1fr))',
+        'gap': '20px',
+        'marginBottom': '30px',
+        'textAlign': 'center'
+    })
+
+    # --- Prepare visuals ---
+    drilldown_style = {'display': 'block', 'marginTop': '30px'}
+    # Scatter plots get a capped, per-segment sample; pie and bar use all rows
+    plot_sample = stratified_sample(results, MAX_SCATTER_POINTS)
+
+
+    #summary section ended 
+
+    output_container = html.Div([
+        html.H2("📊 Customer Segmentation Analysis", style={'textAlign': 'center', 'color': '#f73600'}),
+        html.H4(f"Uploaded File: {filename}", style={'textAlign': 'center'}),
+        summary_cards,
+        html.P(msg, style={'color': 'green', 'textAlign': 'center'}),
+        html.P(msg, style={'color': 'green', 'textAlign': 'center'}),
+
+        # --- Add PDF download button ---
+        html.Div([
+            html.Button("📄 Download Report (PDF)", id='btn-download-pdf', n_clicks=0, className='button'),
+            html.Div(id='pdf-progress', style={'marginTop': '8px', 'color': '#666'})
+        ], style={'textAlign': 'center', 'marginBottom': '20px'}),
+
+        # --- Segmented data export (generated only when requested) ---
+        html.Div([
+            dcc.RadioItems(
+                id='export-format',
+                options=[{'label': label, 'value': fmt} for fmt, (label, _) in EXPORT_FORMATS.items()],
+                value='csv',
+                inline=True,
+                style={'marginBottom': '8px'}
+            ),
+            html.Button("⬇️ Download Segmented Data", id='btn-download-results', n_clicks=0, className='button')
+        ], style={'textAlign': 'center', 'marginBottom': '20px'}),
+
+        # --- Data table (paged, sorted and filtered on the server) ---
+        dash_table.DataTable(
+            id='results-table',
+            columns=[{'name': col, 'id': col} for col in results.columns],
+            data=results.iloc[:TABLE_PAGE_SIZE].to_dict('records'),
+            page_current=0,
+            page_size=TABLE_PAGE_SIZE,
+            page_count=max(1, math.ceil(len(results) / TABLE_PAGE_SIZE)),
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='multi',
+            sort_by=[],
+            filter_action='custom',
+            filter_query='',
+            style_header={
+                'backgroundColor': '#f73600',
+                'color': '#fff9d3',
+                'textAlign': 'center',
+                'fontWeight': 'bold'
+            },
+            style_cell={
+                'textAlign': 'center',
+                'verticalAlign': 'middle',
+                'padding': '8px'
+            },
+        ),
+
+        html.Hr(),
+        html.H3("📈 Visualizations", style={'textAlign': 'center'}),
+        html.Div([
+            #3d scater plot chart 
+            dcc.Graph(
+                figure=px.pie(
+                    results, 
+                    names='Segment', 
+                    title='Segment Distribution'
+                )
             ),
-            html.Br(),
-            html.A(
-                "⬇️ Download Segmented Data (CSV)",
-                id='download-link',
-                download="segmented_customers.csv",
-                href="data:text/csv;charset=utf-8," + results.to_csv(index=False),
-                target="_blank",
-                style={
-                    'display': 'block',
-                    'textAlign': 'center',
-                    'margin': '10px 0',
-                    'fontSize': '16px',
-                    'color': '#007bff'
-                 }
+            dcc.Graph(
+                figure=px.bar(
+                    results.groupby("Segment")[["Recency", "Frequency", "Monetary"]]
+                    .mean().reset_index(),
+                    x="Segment", 
+                    y=["Recency", "Frequency", "Monetary"], 
+                    barmode='group',
+                    title='Average RFM Values per Segment'
+                )
             ),
+            dcc.Graph(
+                figure=px.scatter_3d(
+                    plot_sample,
+                    x='Recency',
+                    y='Frequency',
+                    z='Monetary',
+                    color='Segment',
+                    size='Monetary',
+                    title='3D Customer Segments Visualization' + sampling_note(plot_sample, results),
+                    hover_data=['Segment']
+                )
+            )
 
-            html.Hr(),
-            html.H3("📈 Visualizations", style={'textAlign': 'center'}),
-            html.Div([
-                dcc.Graph(
-                    figure=px.pie(results, names='Segment', title='Segment Distribution')
-                ),
-
-                dcc.Graph(
-                    figure=px.bar(
-                        results.groupby("Segment")[["Recency", "Frequency", "Monetary"]]
-                        .mean().reset_index(),
-                        x="Segment",
-                        y=["Recency", "Frequency", "Monetary"],
-                        barmode='group',
-                        title='Average RFM Values per Segment'
-                    )
-                 )
-            ], style={'display': 'flex', 'justifyContent': 'space-around', 'flexWrap': 'wrap'}),
+            #end 3d scater plot chart 
+        ], style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'space-around'}),
+    ])
 
-            html.Div([
-                 dcc.Graph(
-                     figure=px.scatter(
-                        results,
-                        x='Recency',
-                        y='Monetary',
-                        color='Segment',
-                        title='Customer Segments by Recency vs Monetary Value',
-                        size='Frequency',
-                        hover_data=['Segment']
-                    )
-                )
-            ], style={'marginTop': '30px'}),
 
-            html.Hr(),
-            html.Div([
-                html.P("Developed by kuljit kaur  | Customer Segmentation Dashboard", 
-                    style={'textAlign': 'center', 'fontWeight': 'bold', 'color': '#444'}),
-        
-                html.P("Analyze customer behavior using RFM Model (Recency, Frequency, Monetary)",
-                    style={'textAlign': 'center', 'color': '#666'}),
-            ])
-        ])
+    #" going to repalce for adding dowmload report option"
 
-#end of  new code block 
-        return output_container, drilldown_style, results.to_json(date_format='iso', orient='split')
-    except Exception as e:
-        return html.Div(['Error processing file: {}'.format(e)]), {'display': 'none'}, None
+    return output_container, drilldown_style, results_key
+
+#new code blck 2  ends here
+
+# --- Segmented data export ---
+# format -> (option label, file name)
+EXPORT_FORMATS = {
+    'csv': ("CSV", "segmented_customers.csv"),
+    'csv.gz': ("CSV (gzip)", "segmented_customers.csv.gz"),
+}
+# Parquet is only offered when pyarrow is installed (as in ingest.load_transactions)
+try:
+    import pyarrow  # noqa: F401  (needed by DataFrame.to_parquet)
+    EXPORT_FORMATS['parquet'] = ("Parquet", "segmented_customers.parquet")
+except ImportError:
+    pass
+
+@app.callback(
+    Output("download-results", "data"),
+    Input("btn-download-results", "n_clicks"),
+    [State("export-format", "value"),
+     State("stored-results-data", "data")],
+    prevent_initial_call=True
+)
+def export_results(n_clicks, export_format, results_key):
+    df = results_cache.get(results_key) if results_key else None
+    if df is None or export_format not in EXPORT_FORMATS:
+        return dash.no_update
+
+    filename = EXPORT_FORMATS[export_format][1]
+    if export_format == 'csv':
+        return dcc.send_data_frame(df.to_csv, filename, index=False)
+    if export_format == 'csv.gz':
+        return dcc.send_bytes(lambda buffer: df.to_csv(buffer, index=False, compression='gzip'), filename)
+    return dcc.send_bytes(lambda buffer: df.to_parquet(buffer, index=False), filename)
+
+# --- Scatter plot decimation ---
+MAX_SCATTER_POINTS = 5000
+MIN_POINTS_PER_SEGMENT = 50
+
+def stratified_sample(df: pd.DataFrame, max_points: int, by: str = 'Segment', random_state: int = 42) -> pd.DataFrame:
+    """
+    Draws at most about max_points rows, sampling each segment in proportion
+    to its size (small segments keep up to MIN_POINTS_PER_SEGMENT rows so
+    they stay visible).
+
+    Args:
+        df (pd.DataFrame): The full results.
+        max_points (int): Target number of plotted points.
+        by (str): Column to stratify on.
+        random_state (int): Seed, so the same upload always plots the same points.
+
+    Returns:
+        pd.DataFrame: The sampled rows (df itself if it is small enough).
+    """
+    if len(df) <= max_points:
+        return df
+
+    fraction = max_points / len(df)
+    rng = np.random.default_rng(random_state)
+    picked = []
+    for positions in df.groupby(by, sort=False).indices.values():
+        n = max(min(len(positions), MIN_POINTS_PER_SEGMENT), int(round(len(positions) * fraction)))
+        picked.append(rng.choice(positions, size=n, replace=False))
+    return df.iloc[np.sort(np.concatenate(picked))]
+
+def sampling_note(sample: pd.DataFrame, full: pd.DataFrame) -> str:
+    """Title suffix stating how many of the customers a chart shows."""
+    if len(sample) == len(full):
+        return ""
+    return f" (sample: {len(sample):,} of {len(full):,} customers, {len(sample) / len(full):.1%})"
+
+# --- Server-side table paging ---
+TABLE_PAGE_SIZE = 10
+
+FILTER_OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'],
+                    ['ne ', '!='], ['eq ', '='], ['contains '], ['datestartswith ']]
+
+def split_filter_part(filter_part):
+    """
+    Parses one clause of a DataTable filter_query, e.g. "{Monetary} > 500".
+
+    Returns:
+        tuple: (column, operator, value), or (None, None, None) if unparsable.
+    """
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                v0 = value_part[:1]
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1:-1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # word operators need spaces after them in the filter string,
+                # but we don't want these later
+                return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+def query_results(df: pd.DataFrame, sort_by: list, filter_query: str) -> pd.DataFrame:
+    """
+    Applies a DataTable filter_query and sort_by to the cached results.
+
+    Args:
+        df (pd.DataFrame): The cached results.
+        sort_by (list): DataTable sort_by entries ({'column_id', 'direction'}).
+        filter_query (str): DataTable filter expression ("... && ...").
+
+    Returns:
+        pd.DataFrame: The matching rows in the requested order.
+    """
+    for filter_part in (filter_query or '').split(' && '):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue
+        if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            # these operators match pandas series operator method names
+            df = df.loc[getattr(df[col_name], operator)(filter_value)]
+        elif operator == 'contains':
+            df = df.loc[df[col_name].astype(str).str.contains(str(filter_value), regex=False)]
+        elif operator == 'datestartswith':
+            df = df.loc[df[col_name].astype(str).str.startswith(str(filter_value))]
+
+    if sort_by:
+        df = df.sort_values(
+            [col['column_id'] for col in sort_by],
+            ascending=[col['direction'] == 'asc' for col in sort_by],
+            kind='mergesort'
+        )
+    return df
+
+@app.callback(
+    [Output('results-table', 'data'),
+     Output('results-table', 'page_count'),
+     Output('results-table', 'page_current')],
+    [Input('results-table', 'page_current'),
+     Input('results-table', 'page_size'),
+     Input('results-table', 'sort_by'),
+     Input('results-table', 'filter_query')],
+    State('stored-results-data', 'data'),
+    prevent_initial_call=True
+)
+def update_results_table(page_current, page_size, sort_by, filter_query, results_key):
+    df = results_cache.get(results_key) if results_key else None
+    if df is None:
+        return [], 1, 0
+
+    try:
+        view = query_results(df, sort_by, filter_query)
+    except TypeError:
+        # e.g. a numeric comparison against a text column
+        view = df.iloc[0:0]
+
+    page_size = page_size or TABLE_PAGE_SIZE
+    page_count = max(1, math.ceil(len(view) / page_size))
+    # A new filter or sort starts from the first page; otherwise stay within the pages that exist
+    if {'results-table.sort_by', 'results-table.filter_query'} & set(ctx.triggered_prop_ids):
+        page_current = 0
+    page_current = min(page_current or 0, page_count - 1)
+
+    start = page_current * page_size
+    return view.iloc[start:start + page_size].to_dict('records'), page_count, page_current
+
+# --- Customer drill-down index ---
+CUSTOMER_ID_COLUMNS = ['CustomerID', 'customer_id', 'CustID', 'ID']
+MAX_CUSTOMER_OPTIONS = 50
+
+def get_customer_index(results_key: str, df: pd.DataFrame):
+    """
+    Returns the CustomerIndex of an upload, building it on first use.
+
+    Args:
+        results_key (str): Cache key of the upload.
+        df (pd.DataFrame): The cached results for that key.
+
+    Returns:
+        CustomerIndex: The index, or None if df has no customer ID column.
+    """
+    index = customer_index_cache.get(results_key)
+    if index is None:
+        # Try to find a column similar to 'CustomerID'
+        customer_col = next((col for col in CUSTOMER_ID_COLUMNS if col in df.columns), None)
+        if customer_col is None:
+            return None
+        index = CustomerIndex(df[customer_col].to_numpy())
+        customer_index_cache.put(results_key, index)
+    return index
 
 @app.callback(
     Output('customer-drilldown-section', 'children'),
     Input('stored-results-data', 'data')
 )
-def update_drilldown_section(jsonified_data):
-    if jsonified_data is None:
+def update_drilldown_section(results_key):
+    if results_key is None:
         return ""
 
-    df = pd.read_json(StringIO(jsonified_data), orient='split')
-
-    # Try to find a column similar to 'CustomerID'
-    possible_cols = ['CustomerID', 'customer_id', 'CustID', 'ID']
-    customer_col = next((col for col in possible_cols if col in df.columns), None)
+    df = results_cache.get(results_key)
+    if df is None:
+        return html.Div("⚠️ These results have expired from the server cache. Please upload the file again.")
 
-    if not customer_col:
+    index = get_customer_index(results_key, df)
+    if index is None:
         return html.Div("⚠️ No 'CustomerID' column found in your uploaded file.")
 
+    # Options are fetched by prefix as the user types (see update_customer_options)
     return html.Div([
         html.H3("Customer Profile Drill-Down"),
         dcc.Dropdown(
             id='customer-dropdown',
-            options=[{'label': cid, 'value': cid} for cid in df[customer_col].unique()],
-            placeholder="Select a Customer ID to view details"
+            options=[],
+            placeholder=f"Type a Customer ID to search {len(index):,} customers"
         ),
         html.Div(id='customer-profile-output')
     ])
 
+@app.callback(
+    Output('customer-dropdown', 'options'),
+    Input('customer-dropdown', 'search_value'),
+    [State('customer-dropdown', 'value'),
+     State('stored-results-data', 'data')],
+    prevent_initial_call=True
+)
+def update_customer_options(search_value, current_value, results_key):
+    if not search_value or not results_key:
+        # Keep the selected customer displayable once the search box is cleared
+        return [{'label': current_value, 'value': current_value}] if current_value else dash.no_update
+
+    df = results_cache.get(results_key)
+    index = get_customer_index(results_key, df) if df is not None else None
+    if index is None:
+        return []
 
+    matches = index.search(search_value, MAX_CUSTOMER_OPTIONS)
+    if current_value and current_value not in matches:
+        matches.append(current_value)
+    return [{'label': cid, 'value': cid} for cid in matches]
 
 @app.callback(
     Output('customer-profile-output', 'children'),
     Input('customer-dropdown', 'value'),
     State('stored-results-data', 'data')
 )
-def display_customer_profile(customer_id, jsonified_data):
-    if not customer_id or not jsonified_data:
+def display_customer_profile(customer_id, results_key):
+    if not customer_id or not results_key:
         return ""
-    df = pd.read_json(jsonified_data, orient='split')
-    customer_data = df[df['CustomerID'] == customer_id].iloc[0]
+    df = results_cache.get(results_key)
+    if df is None:
+        return html.Div("⚠️ These results have expired from the server cache. Please upload the file again.")
+
+    index = get_customer_index(results_key, df)
+    position = index.lookup(customer_id) if index is not None else None
+    if position is None:
+        return html.Div(f"⚠️ Customer {customer_id} was not found in these results.")
+    customer_data = df.iloc[position]
     
     recommendations = {
         "vip": "Nurture with loyalty programs and exclusive offers.",
@@ -707,35 +1201,77 @@ from dash import Output, Input, State
 import dash
 
 
-@app.callback(
-    Output("download-pdf", "data"),
-    Input("btn-download-pdf", "n_clicks"),
-    State("stored-results-data", "data"),
-    prevent_initial_call=True
-)
-def generate_pdf_report(n_clicks, json_data):
-    if not json_data:
-        return dash.no_update
+# --- PDF reports ---
+# Reports are cached on disk per results key (upload contents + model version).
+# Background jobs can run in other processes than the one holding results_cache,
+# so each upload's report inputs are also written here as "<results_key>.json".
+REPORT_DIR = Path("artifacts/cache/reports")
+MAX_CACHED_REPORTS = 50
+REPORT_FILENAME = "Customer_Segmentation_Report.pdf"
+
+def save_report_inputs(df: pd.DataFrame, results_key: str):
+    """
+    Writes the per-segment summary the PDF report needs to REPORT_DIR.
+
+    Args:
+        df (pd.DataFrame): The segmented results.
+        results_key (str): Key of the results in results_cache.
+    """
+    inputs_path = REPORT_DIR / f"{results_key}.json"
+    if inputs_path.exists():
+        inputs_path.touch()  # mark as recently used
+        return
+
+    segment_means = df.groupby("Segment")[["Recency", "Frequency", "Monetary"]].mean()
+    inputs = {
+        "total_customers": int(len(df)),
+        "unique_segments": int(df["Segment"].nunique()),
+        "segment_means": [
+            {"segment": str(seg), **{col: float(avg[col]) for col in ["Recency", "Frequency", "Monetary"]}}
+            for seg, avg in segment_means.iterrows()
+        ],
+    }
 
-    # Convert JSON data back to DataFrame
-    df = pd.read_json(io.StringIO(json_data), orient='split')
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = tempfile.NamedTemporaryFile("w", dir=REPORT_DIR, suffix=".json.tmp", delete=False)
+    with tmp:
+        json.dump(inputs, tmp)
+    os.replace(tmp.name, inputs_path)
 
-    # Create a temporary PDF
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    doc = SimpleDocTemplate(tmp.name)
+def load_report_inputs(results_key: str):
+    """Returns the summary saved by save_report_inputs, or None if it is gone."""
+    try:
+        return json.loads((REPORT_DIR / f"{results_key}.json").read_text())
+    except FileNotFoundError:
+        return None
+
+def build_pdf_report(inputs: dict, out_path: Path, set_progress=None):
+    """
+    Renders the segmentation report from the summary of save_report_inputs.
+
+    The PDF is written to a temporary file next to out_path and moved into
+    place once complete, so a cached report is never half-written.
+
+    Args:
+        inputs (dict): Customer and segment counts plus per-segment RFM means.
+        out_path (Path): Where to store the finished PDF.
+        set_progress (callable): Optional callback receiving progress messages.
+    """
+    report = set_progress or (lambda message: None)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    report("⏳ Summarizing segments...")
     styles = getSampleStyleSheet()
     elements = []
-
     elements.append(Paragraph("Customer Segmentation Report", styles["Title"]))
     elements.append(Spacer(1, 12))
-    elements.append(Paragraph(f"Total Customers: {len(df)}", styles["Normal"]))
-    elements.append(Paragraph(f"Unique Segments: {df['Segment'].nunique()}", styles["Normal"]))
+    elements.append(Paragraph(f"Total Customers: {inputs['total_customers']}", styles["Normal"]))
+    elements.append(Paragraph(f"Unique Segments: {inputs['unique_segments']}", styles["Normal"]))
     elements.append(Spacer(1, 12))
 
-    for seg, sub in df.groupby("Segment"):
-        avg = sub[["Recency", "Frequency", "Monetary"]].mean()
+    for avg in inputs["segment_means"]:
         elements.append(Paragraph(
-            f"<b>Segment {seg}</b> — "
+            f"<b>Segment {avg['segment']}</b> — "
             f"Recency: {avg['Recency']:.1f}, "
             f"Frequency: {avg['Frequency']:.1f}, "
             f"Monetary: {avg['Monetary']:.1f}",
@@ -743,48 +1279,99 @@ def generate_pdf_report(n_clicks, json_data):
         ))
         elements.append(Spacer(1, 8))
 
-    doc.build(elements)
+    report("⏳ Rendering PDF...")
+    tmp = tempfile.NamedTemporaryFile(dir=out_path.parent, suffix=".pdf.tmp", delete=False)
+    tmp.close()
+    try:
+        SimpleDocTemplate(tmp.name).build(elements)
+        os.replace(tmp.name, out_path)
+    finally:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+
+def prune_report_cache(report_dir: Path, keep: int):
+    """Deletes all but the `keep` most recently used cached reports and report inputs."""
+    for pattern in ("*.pdf", "*.json"):
+        files = sorted(report_dir.glob(pattern), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old_file in files[keep:]:
+            old_file.unlink(missing_ok=True)
+
+def _pdf_report_download(set_progress, results_key):
+    if not results_key:
+        return dash.no_update
+
+    report_path = REPORT_DIR / f"{results_key}.pdf"
+    if report_path.exists():
+        set_progress("✅ Report ready (cached).")
+        report_path.touch()  # mark as recently used
+        return dcc.send_file(str(report_path), filename=REPORT_FILENAME, type="application/pdf")
 
-    # ✅ Correct encoding for Dash Download
-    with open(tmp.name, "rb") as f:
-        encoded_pdf = base64.b64encode(f.read()).decode("utf-8")
+    # Saved to disk when the results were shown, so any worker process can read them
+    inputs = load_report_inputs(results_key)
+    if inputs is None:
+        set_progress("⚠️ These results have expired from the server cache. Please upload the file again.")
+        return dash.no_update
 
-    return {
-        "content": f"data:application/pdf;base64,{encoded_pdf}",
-        "filename": "Customer_Segmentation_Report.pdf",
-        "type": "application/pdf",
-        "base64": True
-    }
+    build_pdf_report(inputs, report_path, set_progress)
+    prune_report_cache(REPORT_DIR, MAX_CACHED_REPORTS)
+    set_progress("✅ Report ready.")
+    return dcc.send_file(str(report_path), filename=REPORT_FILENAME, type="application/pdf")
+
+if background_callback_manager is not None:
+    @app.callback(
+        Output("download-pdf", "data"),
+        Input("btn-download-pdf", "n_clicks"),
+        State("stored-results-data", "data"),
+        background=True,
+        progress=Output("pdf-progress", "children"),
+        running=[(Output("btn-download-pdf", "disabled"), True, False)],
+        prevent_initial_call=True
+    )
+    def generate_pdf_report(set_progress, n_clicks, results_key):
+        return _pdf_report_download(set_progress, results_key)
+else:
+    @app.callback(
+        Output("download-pdf", "data"),
+        Input("btn-download-pdf", "n_clicks"),
+        State("stored-results-data", "data"),
+        prevent_initial_call=True
+    )
+    def generate_pdf_report(n_clicks, results_key):
+        return _pdf_report_download(lambda message: None, results_key)
+
+# --- What-If prediction lattice ---
+# Built on first use: one model pass over every slider combination (~1M points)
+_prediction_lattice = None
+
+def get_prediction_lattice() -> PredictionLattice:
+    """Returns the lattice of segment predictions for the What-If sliders."""
+    global _prediction_lattice
+    if _prediction_lattice is None:
+        _prediction_lattice = PredictionLattice(segment_model, [RECENCY_RANGE, FREQUENCY_RANGE, MONETARY_RANGE])
+    return _prediction_lattice
 
 #call back for live chart in single orediction 
 # --- Real-time What-If Simulation Callback ---
 
-@app.callback(
-    [Output('prediction-output', 'children'),
-     Output('rfm-profile-chart', 'figure')],
-    [Input('recency-slider', 'value'),
-     Input('frequency-slider', 'value'),
-     Input('monetary-slider', 'value')]
-)
+WHATIF_OUTPUTS = [Output('prediction-output', 'children'),
+                  Output('rfm-profile-chart', 'figure')]
+WHATIF_INPUTS = [Input('recency-slider', 'value'),
+                 Input('frequency-slider', 'value'),
+                 Input('monetary-slider', 'value')]
+
 def update_prediction_output(recency, frequency, monetary):
-    # Build DataFrame for prediction
-    input_df = pd.DataFrame([[recency, frequency, monetary]], columns=["Recency", "Frequency", "Monetary"])
-    result = predict_segments(input_df)
-    predicted_segment = result['Segment'][0]
-
-    # Define typical RFM profiles (for radar comparison)
-    profiles = {
-        "VIP": [20, 30, 7000],
-        "Regular": [60, 10, 2000],
-        "Low-Engaged": [120, 5, 800],
-        "Churned": [180, 1, 200]
-    }
+    # Slider positions are answered from the precomputed lattice
+    predicted_segment = get_prediction_lattice().lookup((recency, frequency, monetary))
+    if predicted_segment is None:
+        input_df = pd.DataFrame([[recency, frequency, monetary]], columns=["Recency", "Frequency", "Monetary"])
+        result = predict_segments(input_df)
+        predicted_segment = result['Segment'].iloc[0]
 
     import plotly.graph_objects as go
     fig = go.Figure()
 
     # Add all average profiles
-    for seg, vals in profiles.items():
+    for seg, vals in WHATIF_PROFILES.items():
         fig.add_trace(go.Scatterpolar(
             r=vals,
             theta=["Recency", "Frequency", "Monetary"],
@@ -810,6 +1397,19 @@ def update_prediction_output(recency, frequency, monetary):
 
     return f"🎯 Predicted Segment: {predicted_segment}", fig
 
+# Clientside: the same prediction and radar chart computed in the browser
+# (assets/whatif.js) from the exported parameters, with no server round trip.
+# Server-side: update_prediction_output answers every slider move.
+if CLIENTSIDE_WHATIF:
+    app.clientside_callback(
+        ClientsideFunction(namespace='whatif', function_name='predict'),
+        WHATIF_OUTPUTS,
+        WHATIF_INPUTS,
+        State('whatif-model-params', 'data')
+    )
+else:
+    app.callback(WHATIF_OUTPUTS, WHATIF_INPUTS)(update_prediction_output)
+
 
 
 
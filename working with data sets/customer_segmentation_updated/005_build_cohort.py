@@ -7,6 +7,9 @@ from pathlib import Path
 import argparse
 import logging
 
+from ingest import load_transactions
+from instrumentation import enable_memory_tracing, instrumented, write_metrics
+
 # --- Setup basic logging ---
 logging.basicConfig(
     level=logging.INFO,
@@ -14,32 +17,11 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-# --- Re-using functions from the first script ---
-def load_raw(path: str) -> pd.DataFrame:
-    """Loads the raw transaction data from a CSV file."""
-    logging.info(f"Loading raw data from: {path}")
-    try:
-        df = pd.read_csv(path, encoding="ISO-8859-1")
-        return df
-    except FileNotFoundError:
-        logging.error(f"Error: The file was not found at {path}")
-        raise
-
-def clean_transactions(df: pd.DataFrame) -> pd.DataFrame:
-    """Cleans the raw transaction DataFrame."""
-    logging.info("Starting transaction data cleaning...")
-    df = df.dropna(subset=["CustomerID"]).copy()
-    df["InvoiceNo"] = df["InvoiceNo"].astype(str)
-    df = df[~df["InvoiceNo"].str.startswith("C")]
-    df = df[(df["Quantity"] > 0) & (df["UnitPrice"] > 0)]
-    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"], dayfirst=True, errors="coerce")
-    df = df.dropna(subset=["InvoiceDate"])
-    return df
-
 # --- New Cohort Analysis Functions ---
 def get_month(x):
     return dt.datetime(x.year, x.month, 1)
 
+@instrumented
 def get_cohort_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Processes the cleaned dataframe to create a cohort retention matrix.
@@ -73,12 +55,11 @@ def get_cohort_data(df: pd.DataFrame) -> pd.DataFrame:
     logging.info("Cohort analysis complete.")
     return retention
 
-def cohort_pipeline(raw_csv_path: str, out_csv_path: str):
+def cohort_pipeline(raw_csv_path: str, out_csv_path: str, cache_dir: str = "artifacts/cache"):
     """Orchestrates the full cohort analysis pipeline."""
     logging.info("--- Starting Cohort Analysis Pipeline ---")
     
-    df_raw = load_raw(raw_csv_path)
-    df_clean = clean_transactions(df_raw)
+    df_clean = load_transactions(raw_csv_path, cache_dir=cache_dir)
     cohort_retention = get_cohort_data(df_clean)
 
     out_path = Path(out_csv_path)
@@ -92,6 +73,20 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Build a cohort analysis from raw transaction data.")
     parser.add_argument("--input", type=str, required=True, help="Path to the raw input CSV file.")
     parser.add_argument("--output", type=str, default="artifacts/cohort_retention.csv", help="Path to save the output cohort CSV file.")
+    parser.add_argument("--cache-dir", type=str, default="artifacts/cache", help="Directory for the cleaned-transaction Parquet cache.")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-parse the raw CSV instead of using the Parquet cache.")
+    parser.add_argument("--metrics", type=str, default=None, help="Optional path of a JSON file to write per-stage timing and memory metrics to.")
+    parser.add_argument("--trace-memory", action="store_true", help="Also record each stage's own allocation peak via tracemalloc (slower).")
     args = parser.parse_args()
 
-    cohort_pipeline(raw_csv_path=args.input, out_csv_path=args.output)
+    if args.trace_memory:
+        enable_memory_tracing()
+
+    cohort_pipeline(
+        raw_csv_path=args.input,
+        out_csv_path=args.output,
+        cache_dir=None if args.no_cache else args.cache_dir
+    )
+
+    if args.metrics:
+        write_metrics(args.metrics)
@@ -0,0 +1,137 @@
+# src/app_cache.py
+# Server-side caches for the Dash app (results are kept here instead of in the browser)
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+def estimate_size(value) -> int:
+    """Approximate memory footprint of a cached value in bytes."""
+    if hasattr(value, "memory_usage"):
+        # pandas DataFrame: include the contents of object (string) columns
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+class ResultCache:
+    """
+    Thread-safe LRU cache bounded by the total size of its values.
+
+    When adding a value would exceed max_bytes, the least recently used
+    entries are evicted first. A single value larger than the budget is
+    still kept (alone) so the current user's results are always available.
+    With ttl_seconds set, entries also expire that long after being stored.
+    Hit/miss/eviction counters are available through stats().
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds
+
+    def _drop(self, key):
+        self._total -= self._entries.pop(key)[1]
+
+    def get(self, key):
+        """Returns the cached value (marking it recently used), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[2]):
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Stores a value under key, evicting expired and least recently used entries as needed."""
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            for old_key in [k for k, (_, _, stored_at) in self._entries.items() if self._expired(stored_at)]:
+                self._drop(old_key)
+                self.expirations += 1
+            while self._entries and self._total + size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._total -= evicted_size
+                self.evictions += 1
+            self._entries[key] = (value, size, time.monotonic())
+            self._total += size
+
+    def stats(self) -> dict:
+        """Returns the cache counters and current memory use."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class CustomerIndex:
+    """
+    Lookup structures over the customer IDs of one results DataFrame:
+    a hash map from ID to row offset (O(1) profile lookups) and a sorted
+    array of the unique IDs (prefix search by binary search).
+
+    IDs are compared as strings, matching what the dropdown sends back.
+    """
+
+    def __init__(self, customer_ids):
+        ids = np.asarray(customer_ids).astype(str)
+        self.positions = {}
+        for position, customer_id in enumerate(ids.tolist()):
+            # Keep the first row of duplicated IDs, like the previous .iloc[0]
+            self.positions.setdefault(customer_id, position)
+        self.sorted_ids = np.unique(ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint, used by ResultCache for its budget."""
+        return int(self.sorted_ids.nbytes + sys.getsizeof(self.positions) * 2)
+
+    def lookup(self, customer_id):
+        """Returns the row offset of customer_id, or None if it is unknown."""
+        return self.positions.get(str(customer_id))
+
+    def search(self, prefix: str, limit: int) -> list:
+        """Returns up to limit IDs starting with prefix, in sorted order."""
+        prefix = str(prefix)
+        start = np.searchsorted(self.sorted_ids, prefix, side="left")
+        end = min(start + limit, len(self.sorted_ids))
+        matches = self.sorted_ids[start:end].tolist()
+        return [customer_id for customer_id in matches if customer_id.startswith(prefix)]
+
+    def __len__(self) -> int:
+        return len(self.sorted_ids)
@@ -0,0 +1,89 @@
+// assets/chunked_upload.js
+// Resumable chunked upload for large files on the Explore page: sends the file
+// selected in #large-upload-input to the /upload routes of 004_app.py in
+// slices, then hands the upload id to Dash through the 'large-upload-done' store.
+
+(function () {
+    const CHUNK_BYTES = 8 * 1024 * 1024;
+    const MAX_RETRIES = 5;
+    const MAX_RESYNCS = 20;
+
+    // Same file (name, size, modification time) -> same id, so a reload resumes it
+    function uploadId(file) {
+        const raw = [file.name, file.size, file.lastModified].join("-");
+        return raw.replace(/[^A-Za-z0-9_-]/g, "_").slice(-128).padStart(8, "_");
+    }
+
+    function setStatus(text) {
+        window.dash_clientside.set_props("large-upload-status", {children: text});
+    }
+
+    async function receivedBytes(id) {
+        const response = await fetch("/upload/" + id);
+        if (!response.ok) {
+            throw new Error((await response.json()).error);
+        }
+        return (await response.json()).offset;
+    }
+
+    async function upload(file) {
+        const id = uploadId(file);
+        let offset = await receivedBytes(id);
+        let retries = 0;
+        let resyncs = 0;
+
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + CHUNK_BYTES);
+            try {
+                const response = await fetch("/upload/" + id + "?offset=" + offset, {method: "PUT", body: chunk});
+                const body = await response.json();
+                if (response.status === 413) {
+                    // Over the server's size limit: retrying cannot help
+                    throw Object.assign(new Error(body.error), {terminal: true});
+                }
+                if (response.status === 409) {
+                    // Out of sync with the server (e.g. a retried chunk was stored); resume from its offset
+                    if (++resyncs > MAX_RESYNCS) {
+                        throw Object.assign(new Error(body.error), {terminal: true});
+                    }
+                    offset = body.offset;
+                    continue;
+                }
+                if (!response.ok) {
+                    throw new Error(body.error);
+                }
+                offset = body.offset;
+                retries = 0;
+                resyncs = 0;
+            } catch (err) {
+                if (err.terminal || ++retries > MAX_RETRIES) {
+                    throw err;
+                }
+                await new Promise(function (resolve) { setTimeout(resolve, 1000 * retries); });
+                offset = await receivedBytes(id);
+            }
+            setStatus("⏳ Uploading " + file.name + ": " + Math.floor(100 * offset / file.size) + "%");
+        }
+
+        const response = await fetch("/upload/" + id + "/complete", {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({filename: file.name})
+        });
+        if (!response.ok) {
+            throw new Error((await response.json()).error);
+        }
+        setStatus("⚙️ Upload complete — segmenting " + file.name + "...");
+        window.dash_clientside.set_props("large-upload-done", {data: {upload_id: id, filename: file.name, completed_at: Date.now()}});
+    }
+
+    // The input is rendered by Dash after page load, so listen on the document
+    document.addEventListener("change", function (event) {
+        if (event.target.id !== "large-upload-input" || !event.target.files.length) {
+            return;
+        }
+        upload(event.target.files[0]).catch(function (err) {
+            setStatus("❌ Upload failed: " + err.message + " (select the file again to resume)");
+        });
+    });
+})();
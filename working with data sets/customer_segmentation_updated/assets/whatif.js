@@ -0,0 +1,54 @@
+// assets/whatif.js
+// Clientside What-If prediction: mirrors inference.SegmentModel.predict and the
+// radar chart of update_prediction_output in 004_app.py, using the parameters
+// exported to the 'whatif-model-params' store.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    whatif: {
+        predict: function (recency, frequency, monetary, params) {
+            if (!params) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+            const model = params.model;
+            const x = [recency, frequency, monetary];
+
+            // scores = x @ W + b; the segment is the argmax of the columns after the clusters
+            let best = -1;
+            let bestScore = -Infinity;
+            for (let j = model.n_clusters; j < model.b.length; j++) {
+                let score = model.b[j];
+                for (let i = 0; i < x.length; i++) {
+                    score += x[i] * model.W[i][j];
+                }
+                if (score > bestScore) {
+                    bestScore = score;
+                    best = j - model.n_clusters;
+                }
+            }
+            const predictedSegment = model.labels[best];
+
+            const theta = ["Recency", "Frequency", "Monetary"];
+            const data = Object.entries(params.profiles).map(function ([seg, vals]) {
+                return {type: "scatterpolar", r: vals, theta: theta, fill: "toself", name: seg, opacity: 0.3};
+            });
+            data.push({
+                type: "scatterpolar",
+                r: x,
+                theta: theta,
+                fill: "toself",
+                name: "Your Input",
+                line: {color: "red", width: 3}
+            });
+
+            const figure = {
+                data: data,
+                layout: {
+                    title: {text: "RFM Profile vs Typical Segments — Predicted: " + predictedSegment},
+                    polar: {radialaxis: {visible: true}},
+                    showlegend: true
+                }
+            };
+            return ["🎯 Predicted Segment: " + predictedSegment, figure];
+        }
+    }
+});
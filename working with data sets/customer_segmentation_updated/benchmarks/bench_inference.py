@@ -0,0 +1,72 @@
+# benchmarks/bench_inference.py
+# Compares the four-artifact predict path with the fused inference.SegmentModel
+
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from inference import SegmentModel
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+def load_artifacts(artifact_dir: str) -> dict:
+    """Loads the five pickled artifacts used by 004_app.py."""
+    artifact_dir = Path(artifact_dir)
+    return {
+        "kmeans_model": joblib.load(artifact_dir / "kmeans_model.pkl"),
+        "scaler": joblib.load(artifact_dir / "scaler.pkl"),
+        "supervised_model": joblib.load(artifact_dir / "supervised_model.pkl"),
+        "supervised_scaler": joblib.load(artifact_dir / "supervised_scaler.pkl"),
+        "label_encoder": joblib.load(artifact_dir / "label_encoder.pkl"),
+    }
+
+def predict_reference(artifacts: dict, df: pd.DataFrame) -> tuple:
+    """The previous predict path: two scalers, two models and the label encoder."""
+    X = df[["Recency", "Frequency", "Monetary"]]
+    clusters = artifacts["kmeans_model"].predict(artifacts["scaler"].transform(X))
+    seg_pred = artifacts["supervised_model"].predict(artifacts["supervised_scaler"].transform(X))
+    return clusters, artifacts["label_encoder"].inverse_transform(seg_pred)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark fused vs step-by-step segment inference.")
+    parser.add_argument("--artifacts", type=str, default="artifacts", help="Directory with the trained artifacts.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of synthetic customers to score.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({
+        "Recency": rng.integers(0, 375, args.rows),
+        "Frequency": rng.integers(1, 100, args.rows),
+        "Monetary": rng.gamma(1.5, 1500.0, args.rows).round(2),
+    })
+    # Score a float32 batch; the reference path sees exactly the same values
+    X32 = df.to_numpy(dtype=np.float32)
+    df = pd.DataFrame(X32.astype(np.float64), columns=df.columns)
+
+    artifacts = load_artifacts(args.artifacts)
+    model = SegmentModel.from_artifacts(artifacts)
+
+    start = time.perf_counter()
+    ref_clusters, ref_segments = predict_reference(artifacts, df)
+    t_reference = time.perf_counter() - start
+
+    start = time.perf_counter()
+    clusters, segments = model.predict(X32)
+    t_fused = time.perf_counter() - start
+
+    mismatches = int((clusters != ref_clusters).sum() + (segments != ref_segments).sum())
+    logging.info(f"Mismatched predictions: {mismatches}")
+    logging.info(f"step-by-step: {t_reference:.3f} s")
+    logging.info(f"fused:        {t_fused:.3f} s")
+    logging.info(f"Speed-up: {t_reference / t_fused:.1f}x")
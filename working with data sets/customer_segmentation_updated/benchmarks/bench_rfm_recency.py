@@ -0,0 +1,72 @@
+# benchmarks/bench_rfm_recency.py
+# Compares the old lambda-based Recency aggregation with rfm_utils.aggregate_rfm
+
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rfm_utils import aggregate_rfm
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+def make_transactions(n_rows: int, n_customers: int, seed: int = 42) -> pd.DataFrame:
+    """Builds a cleaned-looking transaction frame with random customers, dates and totals."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2010-12-01")
+    return pd.DataFrame({
+        "CustomerID": rng.integers(10000, 10000 + n_customers, n_rows),
+        "InvoiceNo": rng.integers(500000, 500000 + n_rows // 5, n_rows).astype(str),
+        "InvoiceDate": start + rng.integers(0, 365 * 24 * 60, n_rows).astype("timedelta64[m]"),
+        "TotalPrice": rng.gamma(2.0, 10.0, n_rows).round(2),
+    })
+
+def lambda_rfm(df: pd.DataFrame, reference_date) -> pd.DataFrame:
+    """The previous implementation: Recency via a Python lambda per customer group."""
+    rfm = df.groupby("CustomerID").agg(
+        Recency=("InvoiceDate", lambda x: (reference_date - x.max()).days),
+        Frequency=("InvoiceNo", "nunique"),
+        Monetary=("TotalPrice", "sum"),
+    ).reset_index()
+    return rfm
+
+def best_of(func, repeats: int) -> float:
+    """Returns the fastest wall time in seconds over a number of runs."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark lambda vs vectorized Recency aggregation.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of transaction rows.")
+    parser.add_argument("--customers", type=int, default=50_000, help="Number of distinct customers.")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per implementation (best is reported).")
+    args = parser.parse_args()
+
+    df = make_transactions(args.rows, args.customers)
+    reference_date = df["InvoiceDate"].max() + pd.Timedelta(days=1)
+    logging.info(f"Generated {len(df):,} rows for {df['CustomerID'].nunique():,} customers.")
+
+    # Both implementations must agree before timings mean anything
+    expected = lambda_rfm(df, reference_date)
+    actual = aggregate_rfm(df, reference_date=reference_date)
+    pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+
+    t_lambda = best_of(lambda: lambda_rfm(df, reference_date), args.repeats)
+    t_fast = best_of(lambda: aggregate_rfm(df, reference_date=reference_date), args.repeats)
+
+    logging.info(f"lambda Recency:     {t_lambda:.3f} s")
+    logging.info(f"vectorized Recency: {t_fast:.3f} s")
+    logging.info(f"Speed-up: {t_lambda / t_fast:.1f}x")
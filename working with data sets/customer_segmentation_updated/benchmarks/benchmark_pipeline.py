@@ -0,0 +1,193 @@
+# benchmarks/benchmark_pipeline.py
+# Times and memory-profiles each stage of the segmentation pipeline, writing a JSON report
+
+import sys
+import os
+import json
+import time
+import platform
+import argparse
+import logging
+import importlib.util
+import multiprocessing as mp
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+def load_script(filename: str):
+    """Imports one of the numbered pipeline scripts (e.g. 002_train_model.py) as a module."""
+    path = PROJECT_DIR / filename
+    name = "stage_" + path.stem.replace(".", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def peak_rss_mb():
+    """Peak resident set size of the current process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# --- Stage bodies (each runs in its own process) ---
+def stage_build_rfm(paths):
+    module = load_script("001._building_rfm.py")
+    module.build_rfm_pipeline(raw_csv_path=paths["raw"], out_csv_path=paths["rfm"], cache_dir=None)
+
+def stage_training(paths):
+    module = load_script("002_train_model.py")
+    # force=True: the manifest would otherwise skip training on a re-run in the same workdir
+    module.training_pipeline(input_path=paths["rfm"], artifacts_dir=paths["artifacts"],
+                             n_clusters=paths["k"], max_k_eval=paths["max_k"], force=True)
+
+def stage_validation(paths):
+    import pandas as pd
+    # Label customers with their cluster so the supervised stage has a 'segments' column
+    clustered = pd.read_csv(Path(paths["artifacts"]) / "rfm_with_clusters.csv")
+    clustered["segments"] = "segment_" + clustered["Cluster"].astype(str)
+    clustered.to_csv(paths["labeled"], index=False)
+
+    module = load_script("003_supervised_validation.py")
+    module.validation_pipeline(input_path=paths["labeled"], artifacts_dir=paths["artifacts"], label_col="segments",
+                               force=True)
+
+def stage_cohort(paths):
+    module = load_script("005_build_cohort.py")
+    module.cohort_pipeline(raw_csv_path=paths["raw"], out_csv_path=paths["cohort"], cache_dir=None)
+
+def stage_predict(paths):
+    import pandas as pd
+    # 004_app.py loads its artifacts relative to the working directory at import time
+    os.chdir(paths["workdir"])
+    module = load_script("004_app.py")
+    df = pd.read_csv(paths["raw"], encoding="ISO-8859-1")
+    module.predict_segments(df)
+
+STAGES = [
+    ("build_rfm_pipeline", stage_build_rfm),
+    ("training_pipeline", stage_training),
+    ("validation_pipeline", stage_validation),
+    ("cohort_pipeline", stage_cohort),
+    ("predict_segments", stage_predict),
+]
+
+def _run_in_child(stage_func, paths, queue):
+    """Runs one stage and reports wall time, CPU time and peak RSS back to the parent."""
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        stage_func(paths)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    queue.put({
+        "wall_s": round(time.perf_counter() - wall_start, 4),
+        "cpu_s": round(time.process_time() - cpu_start, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "error": error,
+    })
+
+def run_benchmark(raw_csv_path: str, workdir: str, report_path: str, k: int = 4, max_k: int = 10,
+                  stages: list = None) -> dict:
+    """
+    Runs each pipeline stage in a fresh process and records its cost.
+
+    Every stage gets its own process so that peak RSS is measured per stage
+    rather than accumulated over the whole run.
+
+    Args:
+        raw_csv_path (str): Raw transaction CSV used as pipeline input.
+        workdir (str): Directory for intermediate outputs and artifacts.
+        report_path (str): Path of the JSON report to write.
+        k (int): Number of clusters for training.
+        max_k (int): Maximum k for the elbow search.
+        stages (list, optional): Names of the stages to run (default: all).
+
+    Returns:
+        dict: The report that was written.
+    """
+    workdir = Path(workdir).resolve()
+    (workdir / "artifacts").mkdir(parents=True, exist_ok=True)
+    paths = {
+        "raw": str(Path(raw_csv_path).resolve()),
+        "workdir": str(workdir),
+        "artifacts": str(workdir / "artifacts"),
+        "rfm": str(workdir / "artifacts" / "rfm.csv"),
+        "labeled": str(workdir / "labeled_customers.csv"),
+        "cohort": str(workdir / "artifacts" / "cohort_retention.csv"),
+        "k": k,
+        "max_k": max_k,
+    }
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for name, stage_func in STAGES:
+        if stages and name not in stages:
+            continue
+        logging.info(f"--- Benchmarking {name} ---")
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_in_child, args=(stage_func, paths, queue))
+        proc.start()
+        result = queue.get()
+        proc.join()
+        result["stage"] = name
+        results.append(result)
+        if result["error"]:
+            logging.error(f"{name} failed: {result['error']}")
+        else:
+            logging.info(f"{name}: {result['wall_s']:.2f} s wall, peak RSS {result['peak_rss_mb']} MB")
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "input": {"path": paths["raw"], "bytes": Path(paths["raw"]).stat().st_size},
+        "params": {"k": k, "max_k": max_k},
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "stages": results,
+    }
+    Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+    Path(report_path).write_text(json.dumps(report, indent=2))
+    logging.info(f"Benchmark report saved to {report_path} ✅")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the segmentation pipeline.")
+    parser.add_argument("--input", type=str, default=None, help="Raw transaction CSV. If omitted, a synthetic file is generated.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows of the synthetic file (ignored with --input).")
+    parser.add_argument("--customers", type=int, default=5000, help="Customers in the synthetic file (ignored with --input).")
+    parser.add_argument("--workdir", type=str, default="benchmarks/run", help="Directory for intermediate outputs.")
+    parser.add_argument("--report", type=str, default="benchmarks/report.json", help="Path of the JSON report.")
+    parser.add_argument("--k", type=int, default=4, help="Number of clusters for training.")
+    parser.add_argument("--max_k", type=int, default=10, help="Maximum k for the elbow search.")
+    parser.add_argument("--stages", nargs="*", default=None, help="Subset of stages to run.")
+    args = parser.parse_args()
+
+    raw_path = args.input
+    if raw_path is None:
+        from generate_synthetic_retail import generate_transactions
+        raw_path = generate_transactions(
+            out_path=Path(args.workdir) / f"synthetic_{args.rows}.csv",
+            n_rows=args.rows,
+            n_customers=args.customers
+        )
+
+    run_benchmark(
+        raw_csv_path=raw_path,
+        workdir=args.workdir,
+        report_path=args.report,
+        k=args.k,
+        max_k=args.max_k,
+        stages=args.stages
+    )
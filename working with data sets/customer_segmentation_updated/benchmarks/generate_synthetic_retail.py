@@ -0,0 +1,130 @@
+# benchmarks/generate_synthetic_retail.py
+# Generates synthetic Online Retail style transaction files of configurable size
+
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+COUNTRIES = ["United Kingdom", "Germany", "France", "EIRE", "Spain", "Netherlands", "Belgium", "Switzerland"]
+
+def generate_transactions(out_path: str,
+                          n_rows: int,
+                          n_customers: int = 5000,
+                          start_date: str = "2010-12-01",
+                          days: int = 365,
+                          cancel_rate: float = 0.02,
+                          missing_customer_rate: float = 0.2,
+                          n_products: int = 4000,
+                          chunk_rows: int = 1_000_000,
+                          seed: int = 42) -> Path:
+    """
+    Writes a CSV with the same columns as the Online Retail export.
+
+    Rows are produced in chunks, so files far larger than memory can be
+    generated. Invoices contain several lines and belong to one customer;
+    a fraction of invoices are cancellations ("C" prefix, negative quantity)
+    and a fraction of lines have no CustomerID, as in the real data.
+
+    Args:
+        out_path (str): Path of the CSV file to write.
+        n_rows (int): Total number of transaction lines.
+        n_customers (int): Number of distinct customers.
+        start_date (str): First possible invoice date.
+        days (int): Length of the date span in days.
+        cancel_rate (float): Fraction of invoices that are cancellations.
+        missing_customer_rate (float): Fraction of lines without a CustomerID.
+        n_products (int): Number of distinct StockCodes.
+        chunk_rows (int): Lines generated and written per chunk.
+        seed (int): Random seed for reproducible files.
+
+    Returns:
+        Path: The path of the written file.
+    """
+    rng = np.random.default_rng(seed)
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    start = np.datetime64(start_date, "m")
+    span_minutes = days * 24 * 60
+    # Skewed spend: a few products are expensive, most are cheap
+    product_prices = np.round(rng.lognormal(mean=1.0, sigma=0.8, size=n_products), 2) + 0.1
+
+    logging.info(f"Generating {n_rows:,} rows for {n_customers:,} customers into {out_path}...")
+    next_invoice = 536365
+    written = 0
+    header = True
+
+    while written < n_rows:
+        rows = min(chunk_rows, n_rows - written)
+
+        # Split the chunk into invoices of 1-20 lines each
+        invoice_sizes = rng.integers(1, 21, size=rows)
+        invoice_sizes = invoice_sizes[np.cumsum(invoice_sizes) - invoice_sizes < rows]
+        invoice_sizes[-1] = rows - invoice_sizes[:-1].sum()
+        n_invoices = len(invoice_sizes)
+
+        invoice_numbers = np.arange(next_invoice, next_invoice + n_invoices)
+        next_invoice += n_invoices
+        invoice_customers = rng.integers(12346, 12346 + n_customers, size=n_invoices).astype(float)
+        invoice_dates = start + rng.integers(0, span_minutes, size=n_invoices).astype("timedelta64[m]")
+        cancelled = rng.random(n_invoices) < cancel_rate
+
+        invoice_no = pd.Series(invoice_numbers.astype(str))
+        invoice_no[cancelled] = "C" + invoice_no[cancelled]
+
+        products = rng.integers(0, n_products, size=rows)
+        quantity = rng.geometric(0.3, size=rows)
+        quantity = np.where(np.repeat(cancelled, invoice_sizes), -quantity, quantity)
+
+        customers = np.repeat(invoice_customers, invoice_sizes)
+        customers[rng.random(rows) < missing_customer_rate] = np.nan
+
+        chunk = pd.DataFrame({
+            "InvoiceNo": np.repeat(invoice_no.values, invoice_sizes),
+            "StockCode": (products + 10000).astype(str),
+            "Description": "PRODUCT " + pd.Series(products).astype(str),
+            "Quantity": quantity,
+            "InvoiceDate": pd.Series(np.repeat(invoice_dates, invoice_sizes)).dt.strftime("%d-%m-%Y %H:%M"),
+            "UnitPrice": product_prices[products],
+            "CustomerID": customers,
+            "Country": np.array(COUNTRIES)[rng.integers(0, len(COUNTRIES), size=rows)],
+        })
+        chunk.to_csv(out_path, mode="w" if header else "a", header=header, index=False, encoding="ISO-8859-1")
+
+        header = False
+        written += rows
+        logging.info(f"  {written:,} / {n_rows:,} rows written")
+
+    return out_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Online Retail transaction CSV.")
+    parser.add_argument("--output", type=str, default="benchmarks/data/synthetic_retail.csv", help="Path of the CSV to write.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Number of transaction lines (e.g. 100000 to 100000000).")
+    parser.add_argument("--customers", type=int, default=5000, help="Number of distinct customers.")
+    parser.add_argument("--start-date", type=str, default="2010-12-01", help="First possible invoice date (YYYY-MM-DD).")
+    parser.add_argument("--days", type=int, default=365, help="Length of the date span in days.")
+    parser.add_argument("--cancel-rate", type=float, default=0.02, help="Fraction of invoices that are cancellations.")
+    parser.add_argument("--missing-customer-rate", type=float, default=0.2, help="Fraction of lines without a CustomerID.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+    args = parser.parse_args()
+
+    generate_transactions(
+        out_path=args.output,
+        n_rows=args.rows,
+        n_customers=args.customers,
+        start_date=args.start_date,
+        days=args.days,
+        cancel_rate=args.cancel_rate,
+        missing_customer_rate=args.missing_customer_rate,
+        seed=args.seed
+    )
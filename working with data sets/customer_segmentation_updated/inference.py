@@ -0,0 +1,300 @@
+# src/inference.py
+# Fused, single-pass segment inference built from the trained artifacts
+
+import numpy as np
+import json
+import logging
+import struct
+from pathlib import Path
+
+from manifest import file_sha256
+
+# Flat binary bundle: magic, format version, JSON header length, JSON header,
+# then the float64 arrays at 64-byte aligned offsets (see SegmentModel.save).
+BUNDLE_MAGIC = b"SEGM"
+BUNDLE_VERSION = 1
+BUNDLE_NAME = "segment_model.bin"
+_ALIGN = 64
+
+# The pickles a bundle is compiled from (file name stem in the artifacts directory)
+ARTIFACT_NAMES = ["kmeans_model", "scaler", "supervised_model", "supervised_scaler", "label_encoder"]
+
+def artifact_hashes(artifacts_dir: str):
+    """
+    Returns the SHA-256 of every pickled artifact, or None if any is missing.
+
+    Stored in the bundle header so a bundle can be checked against the
+    pickles it was compiled from.
+    """
+    paths = {name: Path(artifacts_dir) / f"{name}.pkl" for name in ARTIFACT_NAMES}
+    if not all(p.exists() for p in paths.values()):
+        return None
+    return {name: file_sha256(p) for name, p in paths.items()}
+
+class SegmentModel:
+    """
+    Compiled form of the prediction path used by 004_app.py:
+    scaler -> KMeans -> supervised scaler -> LogisticRegression -> label encoder.
+
+    Both scalers are folded into the weights, so Cluster and Segment are
+    computed from raw Recency/Frequency/Monetary with one matrix product:
+
+        scores = X @ W + b
+
+    The first n_clusters columns rank the KMeans centroids (argmax equals the
+    nearest centroid), the remaining columns are the logistic-regression
+    decision values (argmax equals the predicted class).
+    """
+
+    def __init__(self, W, b, n_clusters: int, label_table, supervised=None, supervised_scaler=None):
+        self.W = np.asarray(W, dtype=np.float64)
+        self.b = np.asarray(b, dtype=np.float64)
+        self.n_clusters = int(n_clusters)
+        self.label_table = np.asarray(label_table)
+        # Non-linear supervised models cannot be folded; they are applied as-is
+        self.supervised = supervised
+        self.supervised_scaler = supervised_scaler
+
+    @classmethod
+    def from_artifacts(cls, artifacts: dict) -> "SegmentModel":
+        """
+        Folds the five fitted artifacts into plain NumPy arrays.
+
+        Args:
+            artifacts (dict): The loaded "scaler", "kmeans_model",
+                "supervised_scaler", "supervised_model" and "label_encoder".
+
+        Returns:
+            SegmentModel: The compiled model.
+        """
+        scaler = artifacts["scaler"]
+        centers = np.asarray(artifacts["kmeans_model"].cluster_centers_, dtype=np.float64)
+        inv_scale = 1.0 / scaler.scale_
+        shift = scaler.mean_ * inv_scale
+
+        # argmin ||x*inv_scale - shift - c||²  ==  argmax x·(c*inv_scale) - shift·c - ||c||²/2
+        W_cluster = (centers * inv_scale).T
+        b_cluster = -(centers @ shift) - 0.5 * (centers ** 2).sum(axis=1)
+
+        clf = artifacts["supervised_model"]
+        le = artifacts["label_encoder"]
+        label_table = le.classes_[np.asarray(clf.classes_).astype(int)]
+
+        if not hasattr(clf, "coef_"):
+            return cls(W_cluster, b_cluster, len(centers), label_table,
+                       supervised=clf, supervised_scaler=artifacts["supervised_scaler"])
+
+        sup_scaler = artifacts["supervised_scaler"]
+        sup_inv_scale = 1.0 / sup_scaler.scale_
+        coef = np.asarray(clf.coef_, dtype=np.float64)
+        intercept = np.asarray(clf.intercept_, dtype=np.float64)
+
+        # (x - mean) / scale · coef + intercept  ==  x·(coef/scale) + (intercept - (mean/scale)·coef)
+        W_seg = (coef * sup_inv_scale).T
+        b_seg = intercept - coef @ (sup_scaler.mean_ * sup_inv_scale)
+        if coef.shape[0] == 1:
+            # Binary case: class 1 wins when the single decision value is > 0
+            W_seg = np.hstack([np.zeros((W_seg.shape[0], 1)), W_seg])
+            b_seg = np.concatenate([[0.0], b_seg])
+
+        return cls(np.hstack([W_cluster, W_seg]), np.concatenate([b_cluster, b_seg]),
+                   len(centers), label_table)
+
+    def save(self, path: str, sources: dict = None):
+        """
+        Writes the compiled parameters to a single versioned binary bundle
+        that load() can memory-map.
+
+        Args:
+            path (str): Path of the bundle file.
+            sources (dict): Optional artifact hashes (see artifact_hashes)
+                recorded in the header.
+
+        Raises:
+            ValueError: If the supervised model could not be folded into arrays.
+        """
+        if self.supervised is not None:
+            raise ValueError("Only linear supervised models can be exported to a bundle.")
+
+        arrays = {"W": self.W, "b": self.b}
+        header = {"n_clusters": self.n_clusters, "labels": [str(x) for x in self.label_table],
+                  "sources": sources, "arrays": {}}
+
+        # Offsets are relative to the start of the data section
+        offset = 0
+        for name, arr in arrays.items():
+            header["arrays"][name] = {"shape": list(arr.shape), "offset": offset}
+            offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+        header_bytes = json.dumps(header).encode("utf-8")
+        prefix_len = 12 + len(header_bytes)
+        data_start = -(-prefix_len // _ALIGN) * _ALIGN
+
+        out_path = Path(path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(out_path, "wb") as f:
+            f.write(BUNDLE_MAGIC + struct.pack("<II", BUNDLE_VERSION, len(header_bytes)) + header_bytes)
+            f.write(b"\0" * (data_start - prefix_len))
+            for name, arr in arrays.items():
+                f.seek(data_start + header["arrays"][name]["offset"])
+                f.write(np.ascontiguousarray(arr, dtype="<f8").tobytes())
+
+    @classmethod
+    def load(cls, path: str, expected_sources: dict = None) -> "SegmentModel":
+        """
+        Memory-maps a bundle written by save(). The arrays are read-only views
+        of the file, so forked workers share the same pages.
+
+        Args:
+            path (str): Path of the bundle file.
+            expected_sources (dict): Optional artifact hashes the bundle must
+                have been compiled from; a bundle from other pickles is rejected.
+
+        Returns:
+            SegmentModel: The compiled model.
+
+        Raises:
+            FileNotFoundError: If the bundle does not exist.
+            ValueError: If the file is not a bundle of a supported version, or
+                does not match expected_sources.
+        """
+        mm = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(mm[:4]) != BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a segment model bundle.")
+        version, header_len = struct.unpack("<II", bytes(mm[4:12]))
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version {version} (expected {BUNDLE_VERSION}).")
+
+        header = json.loads(bytes(mm[12:12 + header_len]).decode("utf-8"))
+        if expected_sources is not None and header.get("sources") != expected_sources:
+            raise ValueError(f"{path} was compiled from different artifacts than the current pickles.")
+        data_start = -(-(12 + header_len) // _ALIGN) * _ALIGN
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            count = int(np.prod(spec["shape"]))
+            arrays[name] = np.frombuffer(mm, dtype="<f8", count=count,
+                                         offset=data_start + spec["offset"]).reshape(spec["shape"])
+
+        model = cls.__new__(cls)
+        model.W, model.b = arrays["W"], arrays["b"]
+        model.n_clusters = header["n_clusters"]
+        model.label_table = np.asarray(header["labels"], dtype=object)
+        model.supervised = model.supervised_scaler = None
+        return model
+
+    def to_dict(self) -> dict:
+        """
+        Returns the compiled parameters as plain lists, e.g. for JSON export
+        to the browser (see assets/whatif.js).
+
+        Raises:
+            ValueError: If the supervised model could not be folded into arrays.
+        """
+        if self.supervised is not None:
+            raise ValueError("Only linear supervised models can be exported.")
+        return {
+            "W": np.asarray(self.W).tolist(),
+            "b": np.asarray(self.b).tolist(),
+            "n_clusters": int(self.n_clusters),
+            "labels": [str(x) for x in self.label_table],
+        }
+
+    def predict(self, X) -> tuple:
+        """
+        Predicts Cluster and Segment for a batch of raw RFM rows.
+
+        Args:
+            X: Array-like of shape (n, 3) with Recency, Frequency, Monetary
+                (float32 or float64).
+
+        Returns:
+            tuple: Cluster labels (int array) and Segment names (array).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        scores = X @ self.W + self.b
+
+        clusters = scores[:, :self.n_clusters].argmax(axis=1)
+        if self.supervised is None:
+            seg_idx = scores[:, self.n_clusters:].argmax(axis=1)
+        else:
+            seg_idx = np.searchsorted(self.supervised.classes_,
+                                      self.supervised.predict(self.supervised_scaler.transform(X)))
+        return clusters, self.label_table[seg_idx]
+
+
+class PredictionLattice:
+    """
+    Segment predictions precomputed for every point of a regular RFM grid,
+    e.g. the positions of the What-If sliders. Lookups are plain array
+    indexing instead of a model call.
+    """
+
+    def __init__(self, model: SegmentModel, axes: list):
+        """
+        Args:
+            model (SegmentModel): The model to evaluate on the grid.
+            axes (list): (start, stop, step) per feature, in Recency,
+                Frequency, Monetary order; stop is inclusive.
+        """
+        self.axes = [tuple(axis) for axis in axes]
+        grids = [np.arange(start, stop + step, step) for start, stop, step in self.axes]
+        points = np.stack(np.meshgrid(*grids, indexing="ij"), axis=-1).reshape(-1, len(grids))
+
+        _, segments = model.predict(points)
+        self.labels, codes = np.unique(segments, return_inverse=True)
+        self.codes = codes.astype(np.uint16).reshape([len(g) for g in grids])
+        logging.info(f"Precomputed {len(points):,} lattice predictions")
+
+    def lookup(self, values):
+        """
+        Returns the segment of a grid point, or None if any value is outside
+        the grid or between its steps.
+        """
+        index = []
+        for value, (start, stop, step) in zip(values, self.axes):
+            if value is None or not start <= value <= stop:
+                return None
+            position, remainder = divmod(value - start, step)
+            if remainder:
+                return None
+            index.append(int(position))
+        return self.labels[self.codes[tuple(index)]]
+
+
+def export_model_bundle(artifacts_dir: str) -> bool:
+    """
+    Compiles the pickled artifacts in artifacts_dir into segment_model.bin.
+
+    Called at the end of training and validation. When no bundle can be
+    written (pickles missing, or a supervised model that is not linear) any
+    existing bundle is deleted, so it never outlives the pickles it was built
+    from.
+
+    Args:
+        artifacts_dir (str): Directory with the pickled artifacts.
+
+    Returns:
+        bool: True if the bundle was written.
+    """
+    import joblib
+
+    artifact_dir = Path(artifacts_dir)
+    bundle_path = artifact_dir / BUNDLE_NAME
+    paths = {name: artifact_dir / f"{name}.pkl" for name in ARTIFACT_NAMES}
+    missing = [p.name for p in paths.values() if not p.exists()]
+    if missing:
+        logging.info(f"Skipping model bundle export; missing artifacts: {missing}")
+        bundle_path.unlink(missing_ok=True)
+        return False
+
+    sources = artifact_hashes(artifact_dir)
+    model = SegmentModel.from_artifacts({name: joblib.load(p) for name, p in paths.items()})
+    try:
+        model.save(bundle_path, sources=sources)
+    except Exception as e:
+        logging.warning(f"Skipping model bundle export: {e}")
+        if bundle_path.exists():
+            bundle_path.unlink()
+            logging.info(f"Removed outdated model bundle {bundle_path}")
+        return False
+    logging.info(f"Model bundle saved to {artifact_dir / BUNDLE_NAME}")
+    return True
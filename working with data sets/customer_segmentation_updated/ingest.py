@@ -0,0 +1,267 @@
+# src/ingest.py
+# Shared raw transaction loading, cleaning and columnar caching (used by 001 and 005)
+
+import pandas as pd
+from pathlib import Path
+import json
+import logging
+
+from instrumentation import instrumented
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+REQUIRED_COLUMNS = ["InvoiceNo", "Quantity", "InvoiceDate", "UnitPrice", "CustomerID"]
+
+# Bump this whenever clean_transactions or the cached dtypes change,
+# so that caches written by an older version are rebuilt.
+CACHE_VERSION = 2
+
+@instrumented
+def load_raw(path: str) -> pd.DataFrame:
+    """
+    Loads the raw transaction data from a CSV file.
+
+    Args:
+        path (str): The file path to the raw CSV data.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the loaded data.
+
+    Raises:
+        FileNotFoundError: If the file at the specified path does not exist.
+        ValueError: If essential columns are missing from the CSV.
+    """
+    logging.info(f"Attempting to load raw data from: {path}")
+    try:
+        # UCI/Kaggle export often needs this specific encoding
+        df = pd.read_csv(path, encoding="ISO-8859-1")
+        logging.info("Raw data loaded successfully.")
+    except FileNotFoundError:
+        logging.error(f"Error: The file was not found at {path}")
+        raise
+
+    # Defensively check for required columns
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
+        logging.error("One or more required columns are missing from the CSV.")
+        raise ValueError(f"CSV must contain the following columns: {REQUIRED_COLUMNS}")
+
+    return df
+
+def _date_format_candidates(sample: pd.Series) -> list:
+    """Day-first and month-first format guesses for the first values of sample."""
+    candidates = []
+    for value in sample.head(20):
+        for dayfirst in (True, False):
+            fmt = guess_datetime_format(value, dayfirst=dayfirst)
+            if fmt and fmt not in candidates:
+                candidates.append(fmt)
+    return candidates
+
+def _count_parsed(sample: pd.Series, fmt: str) -> int:
+    return int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+
+def infer_date_format(values):
+    """
+    Picks one strftime format for a column of date strings.
+
+    Day-first and month-first readings of the values are both tried, and the
+    format that parses the most distinct values wins (day-first on a tie).
+    Using one format for the whole column keeps chunked, partitioned and
+    whole-file parsing identical.
+
+    Args:
+        values (pd.Series): Raw date values.
+
+    Returns:
+        str: The format, or None if no value could be guessed.
+    """
+    sample = pd.Series(values.dropna().astype(str).unique())
+    candidates = _date_format_candidates(sample)
+    if not candidates:
+        return None
+
+    # max() keeps the first of equally good candidates, i.e. the day-first guess
+    return max(candidates, key=lambda fmt: _count_parsed(sample, fmt))
+
+def infer_csv_date_format(path: str, column: str = "InvoiceDate", chunksize: int = 100000, **read_options):
+    """
+    Picks the date format of a CSV column for chunked processing.
+
+    A first chunk alone is often ambiguous (e.g. "12/1/2010" ... "12/9/2010"
+    parse both ways), so only the date column is scanned, chunk by chunk,
+    until one candidate parses more distinct values than the others. The
+    result matches infer_date_format on the whole column.
+
+    Args:
+        path (str): The CSV file.
+        column (str): Name of the date column in the file.
+        chunksize (int): Rows per chunk of the scan.
+        **read_options: Extra pd.read_csv options (e.g. encoding).
+
+    Returns:
+        str: The format, or None if no value could be guessed.
+    """
+    seen = set()
+    counts = {}   # candidate format -> distinct values it parses
+    for chunk in pd.read_csv(path, usecols=[column], chunksize=chunksize, **read_options):
+        # Distinct values not seen in earlier chunks, in order of appearance
+        new_values = pd.Series([v for v in chunk[column].dropna().astype(str).unique() if v not in seen])
+        if new_values.empty:
+            continue
+        seen.update(new_values)
+
+        if not counts:
+            # Candidates come from the first values, as in infer_date_format
+            counts = {fmt: 0 for fmt in _date_format_candidates(new_values)}
+            if not counts:
+                return None
+        for fmt in counts:
+            counts[fmt] += _count_parsed(new_values, fmt)
+
+        ranking = sorted(counts.values(), reverse=True)
+        if len(ranking) == 1 or ranking[0] > ranking[1]:
+            break
+
+    if not counts:
+        return None
+    # Same tie-break as infer_date_format: the first (day-first) candidate wins
+    return max(counts, key=counts.get)
+
+@instrumented
+def clean_transactions(df: pd.DataFrame, date_format: str = None) -> pd.DataFrame:
+    """
+    Cleans the raw transaction DataFrame by handling missing values,
+    removing cancelled orders, and filtering out invalid data points.
+
+    Args:
+        df (pd.DataFrame): The raw transaction DataFrame.
+        date_format (str, optional): Format of InvoiceDate. Inferred from df
+            when omitted; pass the format of the first chunk when cleaning a
+            file piece by piece so every piece is parsed the same way.
+
+    Returns:
+        pd.DataFrame: A cleaned DataFrame ready for RFM calculation.
+    """
+    logging.info("Starting transaction data cleaning...")
+
+    # Drop rows where CustomerID is null, as they are not useful for segmentation
+    df = df.dropna(subset=["CustomerID"]).copy()
+
+    # Ensure InvoiceNo is a string to handle potential mixed types
+    df["InvoiceNo"] = df["InvoiceNo"].astype(str)
+
+    # Remove cancellation invoices (often marked with a 'C')
+    df = df[~df["InvoiceNo"].str.startswith("C")]
+
+    # Remove rows with non-positive quantity or unit price, as they are not valid sales
+    df = df[(df["Quantity"] > 0) & (df["UnitPrice"] > 0)]
+
+    # Convert InvoiceDate to datetime objects with one explicit format, coercing errors
+    if date_format is None:
+        date_format = infer_date_format(df["InvoiceDate"])
+    if date_format is None:
+        df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"], dayfirst=True, errors="coerce")
+    else:
+        df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"], format=date_format, errors="coerce")
+    df = df.dropna(subset=["InvoiceDate"]) # Drop rows where date conversion failed
+
+    # Calculate total price for each transaction
+    df["TotalPrice"] = df["Quantity"] * df["UnitPrice"]
+
+    logging.info(f"Cleaning complete. Shape of cleaned data: {df.shape}")
+    return df
+
+def to_columnar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts a cleaned transaction DataFrame to compact, typed columns:
+    categorical InvoiceNo/StockCode, int32 CustomerID, datetime64 InvoiceDate.
+
+    Args:
+        df (pd.DataFrame): The cleaned transaction DataFrame.
+
+    Returns:
+        pd.DataFrame: The same rows with memory-efficient dtypes.
+    """
+    df = df.reset_index(drop=True)
+    df["InvoiceNo"] = df["InvoiceNo"].astype(str).astype("category")
+    if "StockCode" in df.columns:
+        df["StockCode"] = df["StockCode"].astype(str).astype("category")
+
+    # Numeric IDs fit in int32; anything else (e.g. alphanumeric IDs) stays categorical
+    customer_ids = pd.to_numeric(df["CustomerID"], errors="coerce")
+    if (customer_ids.notna().all() and (customer_ids % 1 == 0).all()
+            and customer_ids.abs().max() < 2**31):
+        df["CustomerID"] = customer_ids.astype("int32")
+    else:
+        df["CustomerID"] = df["CustomerID"].astype(str).astype("category")
+
+    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
+    return df
+
+def _source_fingerprint(path: Path) -> dict:
+    """Identifies a version of the source file by its size and modification time."""
+    stat = path.stat()
+    return {
+        "version": CACHE_VERSION,
+        "source": str(path.resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+def load_transactions(path: str, cache_dir: str = "artifacts/cache") -> pd.DataFrame:
+    """
+    Returns cleaned, typed transactions for a raw CSV, using a Parquet cache.
+
+    The first call parses and cleans the CSV and writes a compressed Parquet
+    copy to cache_dir. Later calls read the cache directly as long as the
+    source file's size and mtime are unchanged.
+
+    Args:
+        path (str): The file path to the raw CSV data.
+        cache_dir (str): Directory holding the Parquet cache. Pass None to
+            disable caching.
+
+    Returns:
+        pd.DataFrame: The cleaned transaction DataFrame (see clean_transactions).
+    """
+    source = Path(path)
+    if cache_dir is None:
+        return to_columnar(clean_transactions(load_raw(path)))
+
+    try:
+        import pyarrow  # noqa: F401  (needed by DataFrame.to_parquet)
+    except ImportError:
+        logging.warning("pyarrow is not installed; reading the raw CSV without a cache.")
+        return to_columnar(clean_transactions(load_raw(path)))
+
+    if not source.exists():
+        logging.error(f"Error: The file was not found at {path}")
+        raise FileNotFoundError(path)
+
+    cache_path = Path(cache_dir) / f"{source.stem}.parquet"
+    meta_path = Path(cache_dir) / f"{source.stem}.meta.json"
+    fingerprint = _source_fingerprint(source)
+
+    if cache_path.exists() and meta_path.exists():
+        try:
+            cached_fingerprint = json.loads(meta_path.read_text())
+        except ValueError:
+            cached_fingerprint = None
+        if cached_fingerprint == fingerprint:
+            logging.info(f"Loading cached transactions from {cache_path}")
+            return pd.read_parquet(cache_path)
+        logging.info("Source file changed since it was cached; rebuilding cache...")
+
+    df = to_columnar(clean_transactions(load_raw(path)))
+
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".parquet.tmp")
+    df.to_parquet(tmp_path, compression="zstd", index=False)
+    tmp_path.replace(cache_path)
+    meta_path.write_text(json.dumps(fingerprint, indent=2))
+    logging.info(f"Cached cleaned transactions to {cache_path}")
+
+    return df
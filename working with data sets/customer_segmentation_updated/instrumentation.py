@@ -0,0 +1,86 @@
+# src/instrumentation.py
+# Per-stage timing and memory instrumentation shared by the 001-005 scripts
+
+import sys
+import json
+import time
+import logging
+import functools
+import tracemalloc
+from pathlib import Path
+
+# Every instrumented call appends one record here; write_metrics dumps them
+METRICS = []
+
+def _peak_rss_mb():
+    """High-water mark of the process resident set size in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def _row_count(obj):
+    """Number of rows of a DataFrame/array (first element for tuples), else None."""
+    if isinstance(obj, tuple) and obj:
+        obj = obj[0]
+    shape = getattr(obj, "shape", None)
+    if shape:
+        return int(shape[0])
+    return None
+
+def instrumented(func):
+    """
+    Decorator recording wall time, CPU time, peak memory and input/output row
+    counts of a pipeline stage.
+
+    Each call is logged as a single "metrics {...}" JSON line and kept in
+    METRICS so it can be written out with write_metrics. Peak memory is the
+    process RSS high-water mark; when tracemalloc is running (see
+    enable_memory_tracing) the stage's own traced allocation peak is added.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        first_arg = args[0] if args else next(iter(kwargs.values()), None)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        result = func(*args, **kwargs)
+
+        record = {
+            "stage": func.__name__,
+            "wall_s": round(time.perf_counter() - wall_start, 4),
+            "cpu_s": round(time.process_time() - cpu_start, 4),
+            "peak_rss_mb": _peak_rss_mb(),
+            "rows_in": _row_count(first_arg),
+            "rows_out": _row_count(result),
+        }
+        if tracing:
+            record["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+
+        METRICS.append(record)
+        logging.info("metrics " + json.dumps(record))
+        return result
+    return wrapper
+
+def enable_memory_tracing():
+    """Starts tracemalloc so stages report their own allocation peak (slower)."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def write_metrics(path: str):
+    """
+    Writes all metrics recorded so far to a JSON file.
+
+    Args:
+        path (str): Path of the metrics JSON file.
+    """
+    out_path = Path(path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(METRICS, indent=2))
+    logging.info(f"Stage metrics saved to {out_path}")
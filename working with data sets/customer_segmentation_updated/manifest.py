@@ -0,0 +1,73 @@
+# src/manifest.py
+# Content-hash manifest so training/validation can skip work on unchanged inputs
+
+import json
+import hashlib
+import logging
+from pathlib import Path
+
+MANIFEST_NAME = "training_manifest.json"
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def compute_cache_key(input_path: str, params: dict) -> str:
+    """
+    Builds the cache key of a pipeline run from its input data and parameters.
+
+    Args:
+        input_path (str): The input file of the stage.
+        params (dict): Every parameter that influences the saved artifacts.
+
+    Returns:
+        str: A SHA-256 hex digest.
+    """
+    payload = {"input_sha256": file_sha256(input_path), "params": params}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _read_manifest(artifacts_dir: str) -> dict:
+    path = Path(artifacts_dir) / MANIFEST_NAME
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def is_up_to_date(artifacts_dir: str, stage: str, key: str) -> bool:
+    """
+    Checks whether a stage already produced its artifacts for this key.
+
+    Args:
+        artifacts_dir (str): Directory holding the artifacts and manifest.
+        stage (str): Name of the stage (e.g. "training").
+        key (str): Cache key from compute_cache_key.
+
+    Returns:
+        bool: True if the manifest entry matches and all its outputs still exist.
+    """
+    entry = _read_manifest(artifacts_dir).get(stage)
+    if not entry or entry.get("key") != key:
+        return False
+    return all((Path(artifacts_dir) / name).exists() for name in entry.get("outputs", []))
+
+def record_run(artifacts_dir: str, stage: str, key: str, params: dict, outputs: list):
+    """
+    Stores the key and outputs of a finished stage in the manifest.
+
+    Args:
+        artifacts_dir (str): Directory holding the artifacts and manifest.
+        stage (str): Name of the stage.
+        key (str): Cache key from compute_cache_key.
+        params (dict): The parameters the key was built from (for reference).
+        outputs (list): Artifact file names produced by the stage.
+    """
+    manifest = _read_manifest(artifacts_dir)
+    manifest[stage] = {"key": key, "params": params, "outputs": outputs}
+    path = Path(artifacts_dir) / MANIFEST_NAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2, default=str))
+    logging.info(f"Recorded {stage} run in {path}")
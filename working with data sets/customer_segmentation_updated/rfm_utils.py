@@ -0,0 +1,46 @@
+# src/rfm_utils.py
+# Shared, vectorized RFM aggregation (used by 001._building_rfm.py and 004_app.py)
+
+import pandas as pd
+import datetime as dt
+
+def aggregate_rfm(df: pd.DataFrame,
+                  customer_col: str = "CustomerID",
+                  date_col: str = "InvoiceDate",
+                  invoice_col: str = "InvoiceNo",
+                  amount_col: str = "TotalPrice",
+                  reference_date=None) -> pd.DataFrame:
+    """
+    Computes Recency, Frequency and Monetary per customer in one grouped pass.
+
+    Recency is derived from a native "max" aggregation followed by a single
+    vectorized subtraction, instead of a Python lambda per customer group.
+
+    Args:
+        df (pd.DataFrame): Transactions with a datetime date column.
+        customer_col (str): Column identifying the customer.
+        date_col (str): Column with the (datetime) invoice date.
+        invoice_col (str): Column with the invoice number.
+        amount_col (str): Column with the line total.
+        reference_date (optional): Date Recency is measured against. Defaults
+            to one day after the last transaction.
+
+    Returns:
+        pd.DataFrame: Columns CustomerID, Recency, Frequency, Monetary, one row
+        per customer, ordered by customer.
+    """
+    if reference_date is None:
+        reference_date = df[date_col].max() + dt.timedelta(days=1)
+
+    grouped = df.groupby(customer_col).agg(
+        LastPurchase=(date_col, "max"),
+        Frequency=(invoice_col, "nunique"),
+        Monetary=(amount_col, "sum"),
+    )
+
+    return pd.DataFrame({
+        "CustomerID": grouped.index,
+        "Recency": (reference_date - grouped["LastPurchase"]).dt.days.values,
+        "Frequency": grouped["Frequency"].values,
+        "Monetary": grouped["Monetary"].values,
+    })
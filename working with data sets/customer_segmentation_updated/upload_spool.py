@@ -0,0 +1,128 @@
+# src/upload_spool.py
+# Disk spool for chunked, resumable uploads to the Dash app (see /upload routes in 004_app.py)
+
+import re
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+
+# Client-chosen upload IDs are used as file names, so keep them to a safe alphabet
+UPLOAD_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,128}$")
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload grows past the spool's max_bytes; retrying cannot succeed."""
+
+class UploadSpool:
+    """
+    Stores uploads as they arrive, one chunk at a time, under spool_dir.
+
+    Each upload is appended to "<upload_id>.part" and renamed to
+    "<upload_id>.data" (with a "<upload_id>.json" holding the original file
+    name) once the client marks it complete. Because chunks are written at
+    explicit offsets, an interrupted upload resumes from offset(upload_id).
+    """
+
+    def __init__(self, spool_dir: str, max_bytes: int = None):
+        self.spool_dir = Path(spool_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()   # Guards _upload_locks only
+        self._upload_locks = {}
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        """Returns the lock serializing writes to one upload; other uploads proceed in parallel."""
+        with self._lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+    def _path(self, upload_id: str, suffix: str) -> Path:
+        if not UPLOAD_ID_PATTERN.match(upload_id or ""):
+            raise ValueError(f"Invalid upload id: {upload_id!r}")
+        return self.spool_dir / f"{upload_id}{suffix}"
+
+    def offset(self, upload_id: str) -> int:
+        """Returns how many bytes of the upload have been received so far."""
+        part = self._path(upload_id, ".part")
+        return part.stat().st_size if part.exists() else 0
+
+    def append(self, upload_id: str, offset: int, stream, block_size: int = 1 << 20) -> int:
+        """
+        Writes the next chunk of an upload.
+
+        Args:
+            upload_id (str): Identifier chosen by the client.
+            offset (int): Byte position of the chunk; must equal offset(upload_id).
+            stream: File-like object with the chunk bytes (e.g. request.stream).
+            block_size (int): Copy buffer size.
+
+        Returns:
+            int: The new size of the upload.
+
+        Raises:
+            ValueError: If the offset does not match the bytes received.
+            UploadTooLarge: If the upload exceeds max_bytes (the chunk is discarded).
+        """
+        part = self._path(upload_id, ".part")
+        with self._upload_lock(upload_id):
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            received = self.offset(upload_id)
+            if offset != received:
+                raise ValueError(f"Chunk offset {offset} does not match {received} bytes received.")
+
+            with open(part, "ab") as f:
+                for block in iter(lambda: stream.read(block_size), b""):
+                    f.write(block)
+                    if self.max_bytes is not None and f.tell() > self.max_bytes:
+                        f.truncate(received)
+                        raise UploadTooLarge(f"Upload exceeds the limit of {self.max_bytes} bytes.")
+                return f.tell()
+
+    def complete(self, upload_id: str, filename: str) -> Path:
+        """
+        Marks an upload as finished and returns the path of its data file.
+
+        Raises:
+            FileNotFoundError: If no bytes were received for upload_id.
+        """
+        part = self._path(upload_id, ".part")
+        data = self._path(upload_id, ".data")
+        with self._upload_lock(upload_id):
+            if part.exists():
+                part.replace(data)
+            elif not data.exists():
+                raise FileNotFoundError(f"No upload in progress for {upload_id}")
+            self._path(upload_id, ".json").write_text(json.dumps({"filename": Path(filename).name}))
+        logging.info(f"Upload {upload_id} complete ({data.stat().st_size} bytes)")
+        return data
+
+    def completed(self, upload_id: str) -> tuple:
+        """
+        Returns the data file and original file name of a completed upload.
+
+        Raises:
+            FileNotFoundError: If the upload was not completed (or was removed).
+        """
+        data = self._path(upload_id, ".data")
+        meta = self._path(upload_id, ".json")
+        if not data.exists() or not meta.exists():
+            raise FileNotFoundError(f"No completed upload {upload_id}")
+        return data, json.loads(meta.read_text())["filename"]
+
+    def remove(self, upload_id: str):
+        """Deletes every file of an upload."""
+        for suffix in (".part", ".data", ".json"):
+            self._path(upload_id, suffix).unlink(missing_ok=True)
+        with self._lock:
+            lock = self._upload_locks.get(upload_id)
+            if lock is not None and not lock.locked():
+                del self._upload_locks[upload_id]
+
+    def purge_stale(self, max_age_seconds: float):
+        """Deletes spooled files that have not been touched for max_age_seconds."""
+        if not self.spool_dir.exists():
+            return
+        cutoff = time.time() - max_age_seconds
+        for path in self.spool_dir.iterdir():
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+